@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
-__all__ = ('bytes', 'set', 'unicode', 'long', 'unichr')
+__all__ = ('bytes', 'set', 'unicode', 'long', 'unichr', 'ContextVar')
 
 import sys
+import threading
 
 PY_MAJOR = sys.version_info[0]
 PY_MINOR = sys.version_info[1]
@@ -34,3 +35,26 @@ try:
     unichr = unichr
 except NameError:
     unichr = chr
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    class ContextVar(object):
+        """Thread-local stand-in for contextvars.ContextVar"""
+
+        def __init__(self, name, default=None):
+            self.name = name
+            self.default = default
+            self._local = threading.local()
+
+        def get(self):
+            return getattr(self._local, 'value', self.default)
+
+        def set(self, value):
+            """Set the value and return a token for reset()"""
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
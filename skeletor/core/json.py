@@ -1,7 +1,9 @@
 from __future__ import absolute_import
 import json
 import os
-from datetime import datetime
+import decimal
+from datetime import date
+from datetime import time
 import logging
 
 
@@ -54,11 +56,17 @@ def _read_includes(path, data):
 
 
 def _handler(obj):
-    """Handle serialization for sets and datetime objects"""
+    """Handle serialization for sets, dates, times and decimals
+
+    Decimals are written as strings so that no precision is lost.
+
+    """
     if type(obj) is set:
         return list(obj)
-    elif isinstance(obj, datetime) and hasattr(obj, 'isoformat'):
+    elif isinstance(obj, (date, time)):
         return obj.isoformat()
+    elif isinstance(obj, decimal.Decimal):
+        return str(obj)
     else:
         raise TypeError(repr(obj) + ' is not JSON serializable')
 
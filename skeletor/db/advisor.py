@@ -0,0 +1,145 @@
+"""Find lookups that are not served by an index
+
+When enabled, the index advisor records the column sets used by the
+`where` and `iwhere` filters in :mod:`skeletor.db.sql` and reports the
+ones that lack an index, which usually means a full table scan.
+
+.. sourcecode:: python
+
+    from skeletor.db import advisor
+
+    index_advisor = advisor.enable()
+    run_workload()
+    for entry in index_advisor.report():
+        print(entry['table'], entry['columns'], entry['calls'])
+
+An index serves a lookup when its leading column is one of the lookup's
+columns.  Case-insensitive `iwhere` lookups need a `lower(column)` index;
+see :func:`skeletor.db.schema.Schema.add_index`.  Lookups that combine
+columns using OR need an index for every column.
+
+"""
+import threading
+
+from sqlalchemy import Column
+from sqlalchemy import UniqueConstraint
+from sqlalchemy.sql.functions import FunctionElement
+
+
+_state = {'advisor': None}
+
+
+class IndexAdvisor(object):
+    """Count lookups by table and column set"""
+
+    def __init__(self):
+        # {(table, columns, lower, match_any): calls}
+        self.usage = {}
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def record(self, table, columns, lower=False, match_any=False):
+        """Count a lookup
+
+        `match_any` is True when the columns are combined using OR.
+
+        """
+        key = (table.fullname, tuple(sorted(columns)), lower, match_any)
+        with self._lock:
+            self.usage[key] = self.usage.get(key, 0) + 1
+            self.tables[table.fullname] = table
+
+    def report(self, include_indexed=False):
+        """Return lookups that lack an index, most frequent first
+
+        Each entry is a dict with `table`, `columns`, `lower`,
+        `match_any`, `calls` and `indexed` keys.
+
+        """
+        with self._lock:
+            usage = list(self.usage.items())
+            tables = dict(self.tables)
+        result = []
+        for (name, columns, lower, match_any), calls in usage:
+            indexed = covered(tables[name], columns, lower=lower,
+                              match_any=match_any)
+            if indexed and not include_indexed:
+                continue
+            result.append({
+                'table': name,
+                'columns': columns,
+                'lower': lower,
+                'match_any': match_any,
+                'calls': calls,
+                'indexed': indexed,
+            })
+        result.sort(key=lambda entry: (-entry['calls'], entry['table'],
+                                       entry['columns']))
+        return result
+
+    def reset(self):
+        with self._lock:
+            self.usage.clear()
+            self.tables.clear()
+
+
+def leading_columns(table):
+    """Return `(column name, lower)` for the leading column of each index
+
+    Primary keys and unique constraints are included because databases
+    index them implicitly.
+
+    """
+    result = set()
+    primary_key = list(table.primary_key.columns)
+    if primary_key:
+        result.add((primary_key[0].name, False))
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.columns:
+            result.add((list(constraint.columns)[0].name, False))
+    for column in table.columns:
+        if column.unique:
+            result.add((column.name, False))
+    for index in table.indexes:
+        if not index.expressions:
+            continue
+        expr = index.expressions[0]
+        if isinstance(expr, Column):
+            result.add((expr.name, False))
+        elif (isinstance(expr, FunctionElement) and
+                expr.name.lower() == 'lower'):
+            args = list(expr.clauses)
+            if len(args) == 1 and isinstance(args[0], Column):
+                result.add((args[0].name, True))
+    return result
+
+
+def covered(table, columns, lower=False, match_any=False):
+    """Is a lookup on `columns` served by one of the table's indexes?"""
+    indexed = leading_columns(table)
+    found = [(column, lower) in indexed for column in columns]
+    if match_any:
+        return all(found)
+    return True in found
+
+
+def enable():
+    """Start recording lookups and return the :class:`IndexAdvisor`"""
+    result = _state['advisor'] = IndexAdvisor()
+    return result
+
+
+def disable():
+    _state['advisor'] = None
+
+
+def current():
+    """Return the active :class:`IndexAdvisor`, or None when disabled"""
+    return _state['advisor']
+
+
+def record(table, columns, lower=False, match_any=False):
+    """Record a lookup with the active advisor, if any"""
+    index_advisor = _state['advisor']
+    if index_advisor is not None:
+        index_advisor.record(table, columns, lower=lower, match_any=match_any)
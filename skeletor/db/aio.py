@@ -0,0 +1,161 @@
+"""Decorators to provide database contexts to coroutine functions
+
+These mirror :mod:`skeletor.db.decorators` for asyncio applications.
+The `creator` is called with a single `commit=True/False` argument and may
+return the context directly or as an awaitable.  The context's `commit()`,
+`rollback()` and `unbind()` methods may likewise be coroutines, which
+allows an asyncio-capable engine or connection to be used.
+
+.. sourcecode:: python
+
+    @aio.async_query.bind(creator=creator)
+    async def get_users(context=None):
+        result = await context.execute(users.select())
+        return result.fetchall()
+
+    users = await get_users()
+
+"""
+
+from skeletor.db import context
+from skeletor.util.aio import AsyncContext
+from skeletor.util.aio import acquire_async_context
+from skeletor.util.aio import resolve
+from skeletor.util import metrics
+from skeletor.util.decorators import bindfunc
+
+
+class AsyncSavepoint(object):
+    """Run a nested coroutine mutator inside a SAVEPOINT
+
+    See :class:`skeletor.db.context.Savepoint`.
+
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    async def __aenter__(self):
+        await self.context.begin_nested()
+        return self.context
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.context.commit()
+        else:
+            await self.context.rollback()
+        return False
+
+
+class AsyncDatabaseContext(AsyncContext):
+
+    def __init__(self, creator=None, context=None, commit=False):
+        AsyncContext.__init__(self)
+        self._creator = creator
+        self._context = context
+        self._commit = commit
+
+    async def acquire(self):
+        if self._context is None:
+            self._context = await resolve(self._creator(commit=self._commit))
+
+    async def release(self):
+        await resolve(self._context.unbind())
+
+    async def success(self):
+        if self._commit:
+            with metrics.timer('commit_seconds'):
+                await self.commit()
+
+    async def error(self):
+        if self._commit:
+            with metrics.timer('rollback_seconds'):
+                await self.rollback()
+
+    def nested(self, commit=False, **kwargs):
+        """Mutators passed a transactional context run in a SAVEPOINT
+
+        Queries, and mutators passed a read-only context, use the context
+        as-is.  The caller remains responsible for the outer transaction.
+
+        """
+        if commit and self._commit:
+            return AsyncSavepoint(self)
+        return context.PassThrough(self)
+
+    async def begin_nested(self):
+        await resolve(self._context.begin_nested())
+
+    async def commit(self):
+        await resolve(self._context.commit())
+
+    async def rollback(self):
+        await resolve(self._context.rollback())
+
+    def __getattr__(self, name):
+        """Delegate attributes to the context"""
+        return getattr(self._context, name)
+
+    def __getitem__(self, item):
+        """Delegate item lookup to the context"""
+        return self._context[item]
+
+
+class AsyncDatabaseFactory(context.DatabaseFactory):
+
+    @staticmethod
+    def create(creator=None, context=None, commit=False):
+        return AsyncDatabaseContext(creator=creator, context=context,
+                                    commit=commit)
+
+
+@bindfunc()
+def async_query(f):
+    """Provide a read-only database context to a coroutine function"""
+    return acquire_async_context(AsyncDatabaseFactory)(f)
+
+
+@bindfunc()
+def async_mutator(f):
+    """Provide a transactional database context to a coroutine function"""
+    return acquire_async_context(AsyncDatabaseFactory, commit=True)(f)
+
+
+@bindfunc(decorator=staticmethod)
+def staticmethod_async_query(f):
+    """Provide a read-only database context to a coroutine function
+
+    :returns: a staticmethod.
+
+    """
+    return acquire_async_context(AsyncDatabaseFactory)(f)
+
+
+@bindfunc(decorator=staticmethod)
+def staticmethod_async_mutator(f):
+    """Provide a transactional database context to a coroutine function
+
+    :returns: a staticmethod.
+
+    """
+    return acquire_async_context(AsyncDatabaseFactory, commit=True)(f)
+
+
+@bindfunc(decorator=classmethod)
+def classmethod_async_query(f):
+    """Provide a read-only database context to a coroutine function
+
+    :returns: a classmethod.
+
+    """
+    return acquire_async_context(AsyncDatabaseFactory)(f)
+
+
+@bindfunc(decorator=classmethod)
+def classmethod_async_mutator(f):
+    """Provide a transactional database context to a coroutine function
+
+    :returns: a classmethod.
+
+    """
+    return acquire_async_context(AsyncDatabaseFactory, commit=True)(f)
@@ -0,0 +1,109 @@
+"""Columnar buffers for query results
+
+Columns are accumulated into NumPy arrays when NumPy is installed and
+into :class:`array.array` buffers otherwise.  The buffer type follows the
+column's type from the schema metadata:
+
+================  ============  ===============
+Column type       NumPy dtype   array typecode
+================  ============  ===============
+Integer           int64         'q'
+Float, Numeric    float64       'd'
+Boolean           bool          'b'
+anything else     object        (a list)
+================  ============  ===============
+
+NULLs cannot be stored in integer and boolean buffers, so a column that
+contains NULLs falls back to an object array or list.  NumPy stores NULL
+floats as NaN.
+
+"""
+import array
+
+from sqlalchemy.sql import sqltypes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# (NumPy dtype, array typecode) for each supported column type
+TYPES = (
+    (sqltypes.Boolean, ('bool', 'b')),
+    (sqltypes.Integer, ('int64', 'q')),
+    (sqltypes.Numeric, ('float64', 'd')),
+)
+
+
+def column_types(column_type):
+    """Return the (NumPy dtype, array typecode) for a column type"""
+    for sql_type, types in TYPES:
+        if isinstance(column_type, sql_type):
+            return types
+    return ('object', None)
+
+
+class ArrayColumn(object):
+    """Accumulate values into an array.array, or a list for other types"""
+
+    def __init__(self, typecode):
+        self.typecode = typecode
+        if typecode is None:
+            self.values = []
+        else:
+            self.values = array.array(typecode)
+
+    def extend(self, values):
+        if self.typecode is not None:
+            try:
+                # Convert the chunk first so that a failure leaves the
+                # buffer untouched.
+                values = array.array(self.typecode, values)
+            except (TypeError, OverflowError):
+                self.typecode = None
+                self.values = self.values.tolist()
+        self.values.extend(values)
+
+    def finish(self):
+        return self.values
+
+
+class NumpyColumn(object):
+    """Accumulate chunks of values and join them into one NumPy array"""
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.chunks = []
+
+    def extend(self, values):
+        dtype = self.dtype
+        # NumPy would silently store NULL booleans as False
+        if dtype == 'bool' and None in values:
+            dtype = 'object'
+        try:
+            chunk = numpy.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            chunk = numpy.array(values, dtype='object')
+        self.chunks.append(chunk)
+
+    def finish(self):
+        if not self.chunks:
+            return numpy.array([], dtype=self.dtype)
+        if len(self.chunks) == 1:
+            return self.chunks[0]
+        return numpy.concatenate(self.chunks)
+
+
+def builder(column_type, use_numpy=None):
+    """Return a column buffer for a column type
+
+    NumPy is used when it is installed unless `use_numpy` is False.
+
+    """
+    dtype, typecode = column_types(column_type)
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy:
+        return NumpyColumn(dtype)
+    return ArrayColumn(typecode)
@@ -0,0 +1,110 @@
+"""Row caches for :class:`skeletor.db.table.Table`
+
+A row cache is a simple key/value store.  :class:`LRUCache` is an
+in-process store with optional expiry.  External stores such as memcached
+can be used by implementing the :class:`RowCache` interface.
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_MAXSIZE = 1024
+
+
+class RowCache(object):
+    """Interface for row cache stores
+
+    Subclasses implement :func:`get`, :func:`set`, :func:`delete`,
+    :func:`clear` and optionally :func:`size`.  Values are returned as-is
+    so stores must return None when a key is missing or expired.
+
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raise NotImplementedError('get() is not implemented')
+
+    def set(self, key, value):
+        raise NotImplementedError('set() is not implemented')
+
+    def delete(self, key):
+        raise NotImplementedError('delete() is not implemented')
+
+    def clear(self):
+        raise NotImplementedError('clear() is not implemented')
+
+    def size(self):
+        """Return the number of cached entries, or None when unknown"""
+        return None
+
+    def record(self, hit):
+        """Record a cache hit or miss"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        """Return a dict of cache counters"""
+        total = self.hits + self.misses
+        if total:
+            hit_rate = float(self.hits) / total
+        else:
+            hit_rate = 0.0
+        return {
+            'size': self.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hit_rate,
+        }
+
+
+class LRUCache(RowCache):
+    """In-process least-recently-used cache with an optional time-to-live"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=None, clock=time.time):
+        RowCache.__init__(self)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._entries.pop(key)
+            except KeyError:
+                return None
+            if expires is not None and expires <= self.clock():
+                return None
+            self._entries[key] = (expires, value)
+            return value
+
+    def set(self, key, value):
+        if self.ttl is None:
+            expires = None
+        else:
+            expires = self.clock() + self.ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
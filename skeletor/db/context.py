@@ -1,4 +1,46 @@
+from skeletor.db import schema
 from skeletor.util import decorators
+from skeletor.util import metrics
+
+
+class Savepoint(object):
+    """Run a nested mutator inside a SAVEPOINT
+
+    The savepoint is released when the mutator succeeds and rolled back
+    when it raises, leaving the enclosing transaction intact.
+
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.mark = 0
+
+    def __enter__(self):
+        self.context.begin_nested()
+        self.mark = len(self.context.pending)
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.context.commit()
+        else:
+            self.context.rollback()
+            # Forget the callbacks registered inside the savepoint
+            del self.context.pending[self.mark:]
+        return False
+
+
+class PassThrough(object):
+    """Provide a context as-is without committing or rolling back"""
+
+    def __init__(self, context):
+        self.context = context
+
+    def __enter__(self):
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
 
 
 class DatabaseContext(decorators.Context):
@@ -8,21 +50,63 @@ class DatabaseContext(decorators.Context):
         if context is None:
             context = creator(commit=commit)
         self._context = context
+        self._creator = creator
         self._commit = commit
+        # Callbacks to run once the transaction commits
+        self.pending = []
 
     def acquire(self):
-        pass
+        if self._commit:
+            self.begin()
 
     def release(self):
         self._context.unbind()
 
     def success(self):
         if self._commit:
-            self.commit()
+            with metrics.timer('commit_seconds'):
+                self.commit()
+            pending, self.pending = self.pending, []
+            for callback in pending:
+                callback()
 
     def error(self):
-        if self.commit:
-            self.rollback()
+        if self._commit:
+            self.pending = []
+            with metrics.timer('rollback_seconds'):
+                self.rollback()
+
+    def on_commit(self, callback):
+        """Call `callback` once the context's transaction has committed
+
+        Callbacks are discarded when the transaction rolls back.  Contexts
+        without a transaction call it immediately, unless the thread has
+        begun a transaction on the engine that the context does not manage,
+        in which case it is discarded.
+
+        """
+        if self._commit:
+            self.pending.append(callback)
+        elif not schema.in_transaction(getattr(self._context, 'engine',
+                                               None)):
+            callback()
+
+    def nested(self, commit=False, **kwargs):
+        """Mutators passed a transactional context run in a SAVEPOINT
+
+        Queries, and mutators passed a read-only context, use the context
+        as-is.  The caller remains responsible for the outer transaction.
+
+        """
+        if commit and self._commit:
+            return Savepoint(self)
+        return PassThrough(self)
+
+    def begin(self):
+        self._context.begin()
+
+    def begin_nested(self):
+        self._context.begin_nested()
 
     def commit(self):
         self._context.commit()
@@ -39,15 +123,40 @@ class DatabaseContext(decorators.Context):
         return self._context[item]
 
 
+def on_commit(context, callback):
+    """Call `callback` once `context` has committed
+
+    See :func:`DatabaseContext.on_commit`.  Other contexts call it
+    immediately.
+
+    """
+    if isinstance(context, DatabaseContext):
+        context.on_commit(callback)
+    else:
+        callback()
+
+
 class DatabaseFactory(decorators.DefaultFactory):
 
     @staticmethod
     def filter_kwargs(kwargs):
         opts = decorators.DefaultFactory.filter_kwargs(kwargs)
         for key in ('commit', 'creator'):
-            opts[key] = kwargs.pop(key, None)
+            if key in kwargs:
+                opts[key] = kwargs.pop(key)
         return opts
 
+    @staticmethod
+    def accepts(context, creator=None, commit=False):
+        """Reuse enclosing contexts from the same creator
+
+        Read-only contexts are not reused by mutators.
+
+        """
+        return (creator is not None and
+                context._creator is creator and
+                (context._commit or not commit))
+
     @staticmethod
     def create(creator=None, context=None, commit=False):
         return DatabaseContext(creator=creator, context=context, commit=commit)
@@ -20,13 +20,16 @@ in the wrapped functions and automatically rolls back mutator
 transactions when an exception occurs.  Upon completion of a mutator
 function, the transaction is committed.
 
-When multiple mutator functions need to be chained then the `context`
-keyword argument must be passed along when calling out to other
-decorated context functions.  e.g. `some_func(context=context)` will
-ensure that the context is reused and passed through as-is rather than
-having to construct a new context for that call.  This is a good thing
-to do in general when calling other wrapped functions since it will
-reuse the existing session instead of creating a new one for that call.
+When decorated functions call other decorated functions that are bound
+to the same creator then the enclosing context is reused automatically.
+The nested call borrows the context and the outermost call commits or
+rolls back.  Mutators never reuse a read-only context from a query.
+
+The `context` keyword argument can also be passed along explicitly when
+calling out to other decorated context functions.  e.g.
+`some_func(context=context)` will ensure that the context is reused and
+passed through as-is rather than having to construct a new context for
+that call.
 
 The expected use case is that you can use these decorators while binding
 them to a custom creator function.  First, we'll define a simple schema.
@@ -100,7 +103,11 @@ or rolls back if an exception occurs.
     create_user()
 
 If you supply the context explicitly then no commit/rollback
-is performed.  You must manually manage the context.
+is performed.  You must manually manage the context.  Mutators that are
+passed a transactional context, or that reuse an enclosing mutator's
+context, run inside a SAVEPOINT.  The savepoint is rolled back when the
+mutator raises so that callers can skip a failing step without losing
+the rest of the transaction.
 
 .. sourcecode:: python
 
@@ -0,0 +1,195 @@
+"""Export tables as JSON-lines files
+
+Rows are streamed from the database using a server-side cursor, where the
+dialect supports one, and written one JSON object per line, so memory use
+is bounded by the fetch size rather than the size of the table.  Values
+are serialized by :func:`skeletor.core.json.dumps`, which writes dates and
+times as ISO-8601 strings, decimals as strings and sets as lists.
+
+.. sourcecode:: python
+
+    from skeletor.db import exporter
+
+    # users.jsonl.gz, documents.jsonl.gz
+    exporter.export_tables([schema.users, schema.documents], 'backup',
+                           compress=True)
+
+    # users.00000.jsonl, users.00001.jsonl, ... of at most 64MB each
+    exporter.export_table(schema.users, 'backup', max_bytes=64 << 20)
+
+"""
+import gzip
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from skeletor.core import json
+from skeletor.db import sql
+
+
+# Number of tables exported at once by export_tables()
+DEFAULT_WORKERS = 4
+
+EXTENSION = '.jsonl'
+
+
+class RotatingWriter(object):
+    """Write lines to a file, starting a new file every `max_bytes`
+
+    Files are named `<prefix>.jsonl`, or `<prefix>.00000.jsonl`,
+    `<prefix>.00001.jsonl`, etc. when `max_bytes` is set, with `.gz`
+    appended when `compress` is True.  Sizes count the uncompressed bytes
+    and a line is never split across files, so a file only exceeds
+    `max_bytes` when it holds a single line that is longer than that.
+
+    """
+
+    def __init__(self, prefix, max_bytes=None, compress=False):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.paths = []
+        self.size = 0
+        self.total_bytes = 0
+        self._fp = None
+
+    def filename(self, index):
+        path = self.prefix
+        if self.max_bytes:
+            path += '.%05d' % index
+        path += EXTENSION
+        if self.compress:
+            path += '.gz'
+        return path
+
+    def open(self):
+        path = self.filename(len(self.paths))
+        if self.compress:
+            self._fp = gzip.open(path, 'wb')
+        else:
+            self._fp = open(path, 'wb')
+        self.paths.append(path)
+        self.size = 0
+
+    def write(self, line):
+        """Write a line, which should end with a newline"""
+        data = line.encode('utf-8')
+        if self._fp is None:
+            self.open()
+        elif (self.max_bytes and self.size and
+                self.size + len(data) > self.max_bytes):
+            self._fp.close()
+            self.open()
+        self._fp.write(data)
+        self.size += len(data)
+        self.total_bytes += len(data)
+
+    def close(self):
+        if self._fp is None and not self.paths:
+            # Create an empty file for an empty table
+            self.open()
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ExportResult(object):
+    """Summary of a table's export
+
+    `count` is the number of rows written, `paths` lists the files that
+    were written and `size` is their uncompressed size in bytes.
+
+    """
+
+    def __init__(self, table, count, paths, size):
+        self.table = table
+        self.count = count
+        self.paths = paths
+        self.size = size
+
+
+def dumps(row):
+    """Serialize a row into a line of JSON"""
+    return json.dumps(dict(row), sort_keys=True) + '\n'
+
+
+def export_rows(rows, writer):
+    """Write rows to a :class:`RotatingWriter` and return the row count"""
+    count = 0
+    for row in rows:
+        writer.write(dumps(row))
+        count += 1
+    return count
+
+
+def export_table(table, directory, columns=None, max_bytes=None,
+                 compress=False, fetch_size=sql.DEFAULT_FETCH_SIZE):
+    """Stream a table's rows into JSON-lines files in `directory`
+
+    :param columns: column names, or :data:`skeletor.db.sql.ALL_COLUMNS`
+        to include deferred columns; defaults to the default columns.
+    :param max_bytes: start a new file once a file reaches this size.
+    :param compress: gzip the files.
+
+    Returns an :class:`ExportResult`.
+
+    """
+    prefix = os.path.join(directory, table.name)
+    rows = sql.iter_all(table, fetch_size=fetch_size, columns=columns)
+    try:
+        with RotatingWriter(prefix, max_bytes=max_bytes,
+                            compress=compress) as writer:
+            count = export_rows(rows, writer)
+    finally:
+        # Release the cursor in this thread rather than when the generator
+        # is garbage collected, which may happen in another thread.
+        rows.close()
+    return ExportResult(table.name, count, writer.paths, writer.total_bytes)
+
+
+def export_tables(tables, directory, workers=DEFAULT_WORKERS, **kwargs):
+    """Export several tables in parallel using up to `workers` threads
+
+    Each thread streams its table over its own connection.  Keyword
+    arguments are passed to :func:`export_table`.  Returns a dict of
+    :class:`ExportResult` by table name.  When an export fails the
+    remaining tables are still exported and the first error is raised.
+
+    """
+    pending = queue.Queue()
+    for table in tables:
+        pending.put(table)
+    results = {}
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                table = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[table.name] = export_table(table, directory,
+                                                   **kwargs)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker)
+               for idx in range(max(1, min(workers, pending.qsize())))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
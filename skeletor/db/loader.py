@@ -0,0 +1,442 @@
+"""Bulk-load CSV and JSON-lines files into tables
+
+Records are streamed from the input, coerced using the column types
+declared in the :class:`skeletor.db.schema.Schema`, and inserted in
+batches using executemany(), so memory use is bounded by the batch size.
+On PostgreSQL, `copy=True` sends each batch using `COPY ... FROM STDIN`.
+
+Each batch is committed in its own transaction.  When a checkpoint file
+is used, the number of records loaded so far is written to it after every
+batch and a later run resumes after the last committed batch.
+
+.. sourcecode:: python
+
+    from skeletor.db import loader
+
+    with open('users.csv') as fp:
+        loader.load(schema.users, loader.read_csv(fp),
+                    checkpoint=loader.Checkpoint('users.checkpoint'))
+
+The loader can also be run from the command line::
+
+    python -m skeletor.db.loader --url sqlite:///app.db \\
+        --schema myapp.schema.Schema --table users users.csv
+
+"""
+import argparse
+import csv
+import datetime
+import decimal
+import io
+import itertools
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from sqlalchemy.sql import sqltypes
+
+from skeletor.cli import options
+from skeletor.core import json
+from skeletor.core import log
+from skeletor.core import util
+from skeletor.core.compat import unicode
+from skeletor.db import sql
+
+
+# Input formats by file extension
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'jsonl',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+# Seconds between progress messages
+DEFAULT_PROGRESS_INTERVAL = 5.0
+
+TRUE_VALUES = frozenset(('1', 't', 'true', 'y', 'yes', 'on'))
+FALSE_VALUES = frozenset(('0', 'f', 'false', 'n', 'no', 'off'))
+
+DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+)
+
+
+def read_csv(fp):
+    """Yield a dict for each row of a CSV file with a header row"""
+    for record in csv.DictReader(fp):
+        yield record
+
+
+def read_jsonl(fp):
+    """Yield the JSON object on each non-blank line of a file"""
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+readers = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def detect_format(path):
+    """Return the input format for a path based on its extension"""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        return FORMATS[ext]
+    except KeyError:
+        raise ValueError('unknown input format: %s' % path)
+
+
+def to_bool(value):
+    lowered = value.strip().lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    raise ValueError('invalid boolean: %r' % value)
+
+
+def to_datetime(value):
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError('invalid datetime: %r' % value)
+
+
+def to_date(value):
+    return to_datetime(value).date()
+
+
+def to_time(value):
+    for fmt in ('%H:%M:%S.%f', '%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.datetime.strptime(value, fmt).time()
+        except ValueError:
+            pass
+    raise ValueError('invalid time: %r' % value)
+
+
+def to_numeric(column_type):
+    if getattr(column_type, 'asdecimal', False):
+        return decimal.Decimal
+    return float
+
+
+def converter(column_type):
+    """Return a function that converts strings for a column type
+
+    Returns None for string columns, whose values are used as-is.
+    The order matters: Boolean and DateTime are checked before the
+    generic numeric types.
+
+    """
+    if isinstance(column_type, sqltypes.Boolean):
+        return to_bool
+    if isinstance(column_type, sqltypes.Integer):
+        return int
+    if isinstance(column_type, sqltypes.Numeric):
+        return to_numeric(column_type)
+    if isinstance(column_type, sqltypes.DateTime):
+        return to_datetime
+    if isinstance(column_type, sqltypes.Date):
+        return to_date
+    if isinstance(column_type, sqltypes.Time):
+        return to_time
+    return None
+
+
+class Coercer(object):
+    """Convert input records into insert parameters for a table
+
+    String values are converted using the column types.  Empty strings
+    in non-string columns become NULL.  Values that are already typed,
+    e.g. numbers from JSON input, are used as-is.  Unknown columns are
+    an error.
+
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.converters = dict((column.name, converter(column.type))
+                               for column in table.columns)
+
+    def __call__(self, record):
+        result = {}
+        for name, value in record.items():
+            try:
+                convert = self.converters[name]
+            except KeyError:
+                raise ValueError('unknown column in %s: %s'
+                                 % (self.table.name, name))
+            if convert is not None and isinstance(value, (str, unicode)):
+                if value == '':
+                    value = None
+                else:
+                    value = convert(value)
+            result[name] = value
+        return result
+
+
+class Checkpoint(object):
+    """Remember how many input records have been loaded
+
+    The checkpoint records the input and table names.  A checkpoint for a
+    different input or table is ignored rather than resumed.
+
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def load(self, source=None, table=None):
+        """Return the number of records to skip"""
+        data = json.read(self.path)
+        if not data:
+            return 0
+        if data.get('source') != source or data.get('table') != table:
+            return 0
+        return data.get('count', 0)
+
+    def save(self, count, source=None, table=None):
+        """Atomically record that `count` records have been loaded"""
+        tmp_path = self.path + '.tmp'
+        data = {'count': count, 'source': source, 'table': table}
+        if not json.write(data, tmp_path):
+            raise IOError('unable to write checkpoint: %s' % tmp_path)
+        os.rename(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Progress(object):
+    """Log the number of records loaded at most every `interval` seconds"""
+
+    def __init__(self, logger=None, interval=DEFAULT_PROGRESS_INTERVAL,
+                 clock=time.time):
+        self.logger = logger or log.logger(__name__)
+        self.interval = interval
+        self.clock = clock
+        self.start = self.last = clock()
+        self.count = 0
+
+    def update(self, count):
+        now = self.clock()
+        self.count += count
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report(now)
+
+    def report(self, now=None):
+        if now is None:
+            now = self.clock()
+        elapsed = now - self.start
+        if elapsed > 0:
+            rate = self.count / elapsed
+        else:
+            rate = 0.0
+        self.logger.info('loaded %d records (%.0f records/s)'
+                         % (self.count, rate))
+
+
+class LoadResult(object):
+    """Summary of a load
+
+    `count` is the number of records inserted by this run and `skipped`
+    is the number of records skipped because a checkpoint said that they
+    were loaded by an earlier run.
+
+    """
+
+    def __init__(self, skipped=0):
+        self.count = 0
+        self.skipped = skipped
+        self.batches = 0
+
+
+def supports_copy(conn):
+    dialect = conn.dialect
+    return dialect.name == 'postgresql' and dialect.driver == 'psycopg2'
+
+
+def column_groups(batch):
+    """Group a batch's parameters by their set of columns"""
+    groups = OrderedDict()
+    for params in batch:
+        groups.setdefault(tuple(sorted(params)), []).append(params)
+    return groups
+
+
+def copy_batch(conn, table, batch):
+    """Send a batch using PostgreSQL's `COPY ... FROM STDIN`"""
+    preparer = conn.dialect.identifier_preparer
+    cursor = conn.connection.cursor()
+    try:
+        for columns, group in column_groups(batch).items():
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for params in group:
+                writer.writerow([copy_value(params[column])
+                                 for column in columns])
+            buf.seek(0)
+            statement = ("COPY %s (%s) FROM STDIN "
+                         "WITH (FORMAT csv, NULL '\\N')"
+                         % (preparer.format_table(table),
+                            ', '.join(preparer.quote(c) for c in columns)))
+            cursor.copy_expert(statement, buf)
+    finally:
+        cursor.close()
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def insert_batch(conn, table, batch):
+    """Insert a batch using executemany() for each set of columns"""
+    expr = table.insert()
+    for group in column_groups(batch).values():
+        conn.execute(expr, group)
+
+
+def load(table, records, batch_size=sql.DEFAULT_BATCH_SIZE, coerce=None,
+         checkpoint=None, source=None, progress=None, copy=False):
+    """Insert records into a table in batches
+
+    :param records: an iterable of dicts, e.g. from :func:`read_csv`.
+    :param coerce: converts each record; defaults to a :class:`Coercer`.
+    :param checkpoint: a :class:`Checkpoint` used to resume a load.
+    :param source: the input's name, stored in the checkpoint.
+    :param progress: a :class:`Progress` instance.
+    :param copy: use `COPY ... FROM STDIN` on PostgreSQL.
+
+    Returns a :class:`LoadResult`.
+
+    """
+    if coerce is None:
+        coerce = Coercer(table)
+    skipped = 0
+    if checkpoint is not None:
+        skipped = checkpoint.load(source=source, table=table.name)
+    result = LoadResult(skipped=skipped)
+    records = itertools.islice(records, skipped, None)
+
+    conn = sql.connect(table.bind)
+    try:
+        if copy and supports_copy(conn):
+            execute = copy_batch
+        else:
+            execute = insert_batch
+        for batch in sql.chunks(records, batch_size):
+            batch = [coerce(record) for record in batch]
+            trans = conn.begin()
+            try:
+                execute(conn, table, batch)
+                trans.commit()
+            except BaseException:
+                trans.rollback()
+                raise
+            result.count += len(batch)
+            result.batches += 1
+            if checkpoint is not None:
+                checkpoint.save(skipped + result.count, source=source,
+                                table=table.name)
+            if progress is not None:
+                progress.update(len(batch))
+    finally:
+        conn.close()
+    if progress is not None:
+        progress.report()
+    return result
+
+
+def main(argv=None, schema=None):
+    """Command-line entry point
+
+    `schema` overrides the --schema option, which lets applications wrap
+    the loader with their own schema.
+
+    """
+    parser = argparse.ArgumentParser(
+        description='load CSV or JSON-lines records into a table')
+    parser.add_argument('--url', required=True, help='database URL')
+    parser.add_argument('--schema', default=None,
+                        help='import path of a Schema subclass, e.g. '
+                             'myapp.schema.Schema')
+    parser.add_argument('--table', required=True, help='table name')
+    parser.add_argument('--format', choices=sorted(readers), default=None,
+                        help='input format (default: from the extension)')
+    parser.add_argument('--batch-size', type=int,
+                        default=sql.DEFAULT_BATCH_SIZE,
+                        help='records per batch (default: %(default)s)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='checkpoint file used to resume a load')
+    parser.add_argument('--create', default=False, action='store_true',
+                        help='create missing tables')
+    parser.add_argument('--copy', default=False, action='store_true',
+                        help='use COPY on PostgreSQL')
+    options.verbose(parser)
+    parser.add_argument('input', help='input file, or - for stdin')
+    args = parser.parse_args(argv)
+
+    log.init(args.verbose)
+    logger = log.logger(__name__)
+
+    if schema is None:
+        if args.schema is None:
+            parser.error('--schema is required')
+        schema = util.import_string(args.schema)()
+    schema.bind_url(args.url)
+    if args.create:
+        schema.create()
+
+    fmt = args.format
+    if fmt is None:
+        if args.input == '-':
+            parser.error('--format is required when reading from stdin')
+        fmt = detect_format(args.input)
+
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint)
+
+    if args.input == '-':
+        fp = sys.stdin
+        source = '-'
+    else:
+        fp = io.open(args.input, 'r', newline='', encoding='utf-8')
+        source = os.path.abspath(args.input)
+    try:
+        result = load(schema[args.table], readers[fmt](fp),
+                      batch_size=args.batch_size, checkpoint=checkpoint,
+                      source=source, progress=Progress(logger=logger),
+                      copy=args.copy)
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+        schema.unbind()
+    logger.info('loaded %d records into %s (%d skipped)'
+                % (result.count, args.table, result.skipped))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Connection pool configuration and statistics
+
+Pool options can be passed to :func:`skeletor.db.schema.Schema.bind_url`
+directly or read from a configuration file:
+
+.. sourcecode:: json
+
+    {
+        "database_url": "postgresql://db/app",
+        "database_pool": {
+            "size": 10,
+            "max_overflow": 5,
+            "timeout": 30,
+            "recycle": 3600,
+            "pre_ping": true
+        }
+    }
+
+.. sourcecode:: python
+
+    from skeletor.db import pool
+    from skeletor.util import config
+
+    values = config.JSONConfig('app.json')
+    schema.bind_url(values['database_url'], pool=pool.config(values))
+    schema.pool_stats()
+
+Engines created by :func:`skeletor.db.schema.engine` count checkouts,
+new connections and invalidations, and time how long callers wait for a
+connection, so pools can be sized for the number of workers.
+
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy import exc
+
+from skeletor.util import metrics
+
+
+# Configuration keys and the create_engine() arguments that they set
+OPTIONS = {
+    'size': 'pool_size',
+    'max_overflow': 'max_overflow',
+    'timeout': 'pool_timeout',
+    'recycle': 'pool_recycle',
+    'pre_ping': 'pool_pre_ping',
+    'use_lifo': 'pool_use_lifo',
+}
+
+# The configuration key read by config()
+CONFIG_KEY = 'database_pool'
+
+# Engine attribute that holds an engine's PoolStats
+STATS = '_skeletor_pool_stats'
+
+
+def options(values):
+    """Return create_engine() arguments for a dict of pool options
+
+    Keys may be given either as configuration keys, e.g. "size", or as
+    create_engine() arguments, e.g. "pool_size".  Unknown keys raise
+    ValueError.  Options set to None are left at sqlalchemy's defaults.
+
+    """
+    result = {}
+    if not values:
+        return result
+    arguments = set(OPTIONS.values())
+    for key, value in values.items():
+        if key.startswith('__'):
+            continue  # e.g. "__doc__" comments in JSON files
+        if key in OPTIONS:
+            key = OPTIONS[key]
+        elif key not in arguments:
+            raise ValueError('unknown pool option: %s' % key)
+        if value is not None:
+            result[key] = value
+    return result
+
+
+def config(values, key=CONFIG_KEY):
+    """Read pool options from a :class:`skeletor.util.config.Config`
+
+    Returns an empty dict when the key is not configured.
+
+    """
+    try:
+        return options(values[key])
+    except KeyError:
+        return {}
+
+
+class PoolStats(object):
+    """Count pool events and record how long checkouts wait"""
+
+    def __init__(self, clock=time.time, buckets=metrics.TIME_BUCKETS):
+        self.clock = clock
+        self.waits = metrics.Histogram(buckets)
+        self.max_wait = 0.0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def observe_wait(self, seconds):
+        with self._lock:
+            self.waits.observe(seconds)
+            self.max_wait = max(self.max_wait, seconds)
+
+    def instrument(self, pool):
+        """Time checkouts from a pool, including pools that it recreates
+
+        Engines check connections out using connect() for implicit
+        execution and unique_connection() for engine.connect().
+
+        """
+        for name in ('connect', 'unique_connection'):
+            setattr(pool, name, self.timed(getattr(pool, name)))
+        recreate = pool.recreate
+
+        def instrumented_recreate():
+            return self.instrument(recreate())
+
+        pool.recreate = instrumented_recreate
+        return pool
+
+    def timed(self, checkout):
+        """Wrap a pool's checkout method to record how long it waits"""
+        def timed_checkout():
+            start = self.clock()
+            try:
+                return checkout()
+            except exc.TimeoutError:
+                self.incr('timeouts')
+                raise
+            finally:
+                self.observe_wait(self.clock() - start)
+        return timed_checkout
+
+    def snapshot(self, pool=None):
+        """Return a dict of counters and the current state of `pool`
+
+        `idle`, `size` and `overflow` are None for pools that do not
+        keep idle connections, e.g. sqlite's NullPool.
+
+        """
+        with self._lock:
+            result = {
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'timeouts': self.timeouts,
+                'wait_seconds': self.waits.to_dict(),
+                'max_wait_seconds': self.max_wait,
+            }
+        result['pool'] = pool.__class__.__name__ if pool is not None else None
+        for key in ('idle', 'size', 'overflow'):
+            result[key] = None
+        if hasattr(pool, 'checkedin'):
+            result['idle'] = pool.checkedin()
+            result['size'] = pool.size()
+            result['overflow'] = pool.overflow()
+        return result
+
+
+def install(engine, clock=time.time):
+    """Collect :class:`PoolStats` for an engine's connection pool"""
+    stats = PoolStats(clock=clock)
+    setattr(engine, STATS, stats)
+    stats.instrument(engine.pool)
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        stats.incr('connects')
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        with stats._lock:
+            stats.checkouts += 1
+            stats.checked_out += 1
+
+    @event.listens_for(engine, 'checkin')
+    def checkin(dbapi_connection, connection_record):
+        stats.incr('checked_out', -1)
+
+    @event.listens_for(engine, 'invalidate')
+    def invalidate(dbapi_connection, connection_record, exception):
+        stats.incr('invalidations')
+
+    @event.listens_for(engine, 'soft_invalidate')
+    def soft_invalidate(dbapi_connection, connection_record, exception):
+        stats.incr('soft_invalidations')
+
+    return stats
+
+
+def stats(engine):
+    """Return a dict of pool statistics for an engine
+
+    Returns None for engines that were not created by
+    :func:`skeletor.db.schema.engine`.
+
+    """
+    pool_stats = getattr(engine, STATS, None)
+    if pool_stats is None:
+        return None
+    return pool_stats.snapshot(engine.pool)
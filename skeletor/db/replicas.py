@@ -0,0 +1,141 @@
+"""Route queries to read replicas and mutators to the primary
+
+:class:`ReplicaRouter` is a `creator` for the database decorators.
+Contexts created for mutators (`commit=True`) are bound to the primary
+database and contexts created for queries are bound to a replica.
+
+.. sourcecode:: python
+
+    router = replicas.ReplicaRouter(
+        Schema, 'postgresql://primary/app',
+        replicas=['postgresql://replica1/app', 'postgresql://replica2/app'],
+        pin_window=2.0)
+
+    @decorators.query.bind(creator=router)
+    def get_users(context=None):
+        ...
+
+After a mutator commits, queries from the same thread or asyncio task are
+pinned to the primary for `pin_window` seconds so that they can read their
+own writes despite replication lag.
+
+"""
+import itertools
+import threading
+import time
+
+from skeletor.core.compat import ContextVar
+from skeletor.db import pool as pool_mod
+from skeletor.db import schema as schema_mod
+
+
+ROUND_ROBIN = 'round-robin'
+LEAST_CONNECTIONS = 'least-connections'
+
+
+class ReplicaRouter(object):
+    """A creator that binds schemas to the primary or to a replica
+
+    :param schema: callable that returns a new, unbound schema.
+    :param primary: URL of the primary database.
+    :param replicas: URLs of the read replicas.
+    :param balance: `round-robin` or `least-connections`.
+    :param pin_window: seconds to keep reading from the primary after a
+        mutator commits.  The window should cover replication lag.
+    :param pool: pool options passed to
+        :func:`skeletor.db.schema.Schema.bind_url`.
+
+    """
+
+    def __init__(self, schema, primary, replicas=(), balance=ROUND_ROBIN,
+                 pin_window=0.0, strategy=schema_mod.DEFAULT_STRATEGY,
+                 pool=None, clock=time.time):
+        if balance not in (ROUND_ROBIN, LEAST_CONNECTIONS):
+            raise ValueError('unknown balance: %r' % balance)
+        self.schema = schema
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.balance = balance
+        self.pin_window = pin_window
+        self.strategy = strategy
+        self.pool = pool
+        self.clock = clock
+        self.counts = {'primary': 0, 'replica': 0, 'pinned': 0}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._pinned_until = ContextVar('skeletor_pinned_until', default=None)
+
+    def __call__(self, commit=False):
+        """Return a schema bound to the database chosen by :func:`route`"""
+        url = self.route(commit=commit)
+        schema = self.schema().bind_url(url, strategy=self.strategy,
+                                        pool=self.pool)
+        if commit:
+            self.pin_on_commit(schema)
+        return schema
+
+    def pin_on_commit(self, schema):
+        """Pin reads to the primary whenever the schema commits
+
+        The window starts when the writes become visible rather than when
+        the mutator starts, so long-running mutators are covered too.
+
+        """
+        commit = schema.commit
+
+        def commit_and_pin():
+            commit()
+            self.pin()
+
+        schema.commit = commit_and_pin
+
+    def route(self, commit=False):
+        """Return the URL for a new context"""
+        if commit or not self.replicas:
+            self.count('primary')
+            return self.primary
+        if self.pinned():
+            self.count('pinned')
+            return self.primary
+        self.count('replica')
+        if self.balance == LEAST_CONNECTIONS:
+            return min(self.replicas, key=self.connections)
+        return self.replicas[next(self._counter) % len(self.replicas)]
+
+    def connections(self, url):
+        """Return the number of connections checked out from a pool
+
+        Pools without checkout counts, e.g. sqlite's NullPool, fall back to
+        the counts kept by :mod:`skeletor.db.pool`.
+
+        """
+        engine = schema_mod.registry.find(url, strategy=self.strategy,
+                                          **pool_mod.options(self.pool))
+        if engine is None:
+            return 0
+        try:
+            return engine.pool.checkedout()
+        except AttributeError:
+            pass
+        stats = pool_mod.stats(engine)
+        if stats is None:
+            return 0
+        return stats['checked_out']
+
+    def pin(self):
+        """Pin the current thread or task's reads to the primary"""
+        self._pinned_until.set(self.clock() + self.pin_window)
+
+    def pinned(self):
+        """Are the current thread or task's reads pinned to the primary?"""
+        until = self._pinned_until.get()
+        return until is not None and self.clock() < until
+
+    def count(self, route):
+        with self._lock:
+            self.counts[route] += 1
+
+    def stats(self):
+        """Return a dict of routing counters"""
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,94 @@
+"""Classify transient database errors for retry policies
+
+.. sourcecode:: python
+
+    from skeletor.db import decorators, retry
+
+    @decorators.mutator.bind(creator=creator, retry=retry.policy())
+    def transfer(source, dest, amount, context=None):
+        ...
+
+Deadlocks, serialization failures, lock timeouts and invalidated
+connections are considered transient.  The whole decorated function is
+re-run in a fresh transaction when one occurs.  Errors are classified
+using the rules for the dialect whose DBAPI module raised them.
+
+"""
+import functools
+
+from sqlalchemy.exc import DBAPIError
+
+from skeletor.util.retry import RetryPolicy
+
+
+def postgresql_transient(error):
+    """serialization_failure and deadlock_detected"""
+    code = getattr(error, 'pgcode', None) or getattr(error, 'sqlstate', None)
+    return code in ('40001', '40P01')
+
+
+def mysql_transient(error):
+    """ER_LOCK_WAIT_TIMEOUT and ER_LOCK_DEADLOCK"""
+    args = getattr(error, 'args', ())
+    return bool(args) and args[0] in (1205, 1213)
+
+
+def sqlite_transient(error):
+    """SQLITE_BUSY and SQLITE_LOCKED"""
+    message = str(error)
+    return ('database is locked' in message or
+            'database table is locked' in message)
+
+
+# Transient error classifiers for DBAPI exceptions, by dialect name
+classifiers = {
+    'postgresql': postgresql_transient,
+    'mysql': mysql_transient,
+    'sqlite': sqlite_transient,
+}
+
+# Dialect names by DBAPI module
+drivers = {
+    'MySQLdb': 'mysql',
+    'mysql': 'mysql',  # mysql.connector
+    'pg8000': 'postgresql',
+    'psycopg2': 'postgresql',
+    'pymysql': 'mysql',
+    'pysqlite2': 'sqlite',
+    'sqlite3': 'sqlite',
+}
+
+
+def dialect_name(error):
+    """Return the dialect name for a DBAPI exception, or None"""
+    return drivers.get(type(error).__module__.split('.')[0])
+
+
+def transient(exc, dialect=None):
+    """Is the exception a transient database error?
+
+    Only the classifier for `dialect` is consulted.  The dialect is
+    detected from the DBAPI exception when it is not specified.
+
+    """
+    if not isinstance(exc, DBAPIError):
+        return False
+    if exc.connection_invalidated:
+        return True
+    if dialect is None:
+        dialect = dialect_name(exc.orig)
+    classify = classifiers.get(dialect)
+    return classify is not None and classify(exc.orig)
+
+
+def policy(max_attempts=3, retryable=None, dialect=None, **kwargs):
+    """Return a :class:`skeletor.util.retry.RetryPolicy` for database errors
+
+    Errors are classified by :func:`transient` for `dialect` unless a
+    `retryable` classifier is specified.
+
+    """
+    if retryable is None:
+        retryable = functools.partial(transient, dialect=dialect)
+    return RetryPolicy(max_attempts=max_attempts, retryable=retryable,
+                       **kwargs)
@@ -0,0 +1,143 @@
+"""Compact row objects
+
+Rows converted to dicts carry a hash table per row.  The classes generated
+here store a row's values in `__slots__` instead, which uses a fraction of
+the memory, while keeping the mapping interface that callers use with
+dicts: `row['name']`, `row.get()`, `keys()`, `items()`, `dict(row)` and
+comparisons against dicts all work.  Values are also available as
+attributes, e.g. `row.name`.
+
+One class is generated per table and set of selected columns.  The class
+for a table's default columns is built by
+:func:`skeletor.db.schema.Schema.add_table`.
+
+"""
+import keyword
+import re
+import threading
+
+
+class Row(object):
+    """Base class for generated row classes"""
+
+    __slots__ = ()
+    _fields = ()
+    _fieldset = frozenset()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Create a row from a dict or other mapping"""
+        return cls(*[mapping[name] for name in cls._fields])
+
+    def __getitem__(self, key):
+        if key not in self._fieldset:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fieldset:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fieldset
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        if isinstance(other, (Row, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        values = ', '.join('%s=%r' % item for item in self.items())
+        return '%s(%s)' % (self.__class__.__name__, values)
+
+    def get(self, key, default=None):
+        if key not in self._fieldset:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return [getattr(self, name) for name in self._fields]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self._fields]
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+# Names that cannot be used as slots without hiding the mapping methods
+RESERVED = frozenset(name for name in dir(Row) if not name.startswith('__'))
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+_lock = threading.Lock()
+
+
+def valid_field(name):
+    """Can a column name be used as a slot?"""
+    return (IDENTIFIER.match(name) is not None and
+            not keyword.iskeyword(name) and
+            name not in RESERVED)
+
+
+def make_row_class(name, fields):
+    """Return a new :class:`Row` subclass with slots for `fields`
+
+    Returns None when a field cannot be used as a slot, e.g. a column
+    named "items", in which case callers keep using dicts.
+
+    """
+    fields = tuple(str(field) for field in fields)
+    if not all(valid_field(field) for field in fields):
+        return None
+    attrs = {
+        '__slots__': fields,
+        '_fields': fields,
+        '_fieldset': frozenset(fields),
+    }
+    return type(str(name), (Row,), attrs)
+
+
+def row_class(table, fields=None):
+    """Return the row class for a table and a sequence of column names
+
+    `fields` defaults to the table's default columns, which exclude
+    deferred columns.  Classes are cached in the table's `info` dict.
+
+    """
+    if fields is None:
+        fields = table.info.get('default_columns') or table.c.keys()
+    fields = tuple(fields)
+    classes = table.info.setdefault('row_classes', {})
+    try:
+        return classes[fields]
+    except KeyError:
+        pass
+    with _lock:
+        if fields not in classes:
+            name = ''.join(part.capitalize()
+                           for part in table.name.split('_')) + 'Row'
+            classes[fields] = make_row_class(name, fields)
+        return classes[fields]
@@ -1,24 +1,218 @@
+import threading
+
+from sqlalchemy import Index
 from sqlalchemy import Table
 from sqlalchemy import MetaData
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy.engine.threadlocal import TLEngine
+from sqlalchemy.engine.url import make_url
+
+from skeletor.db import pool as pool_mod
+from skeletor.db import rows
+from skeletor.db import slowlog
+from skeletor.util import metrics
 
 
 DEFAULT_STRATEGY = 'threadlocal'
 
 
-def engine(url, strategy=DEFAULT_STRATEGY):
-    return create_engine(url, strategy=strategy)
+def engine(url, strategy=DEFAULT_STRATEGY, **kwargs):
+    result = create_engine(url, strategy=strategy, **kwargs)
+    if result.dialect.name == 'sqlite':
+        sqlite_transactions(result)
+    count_statements(result)
+    slowlog.install(result)
+    pool_mod.install(result)
+    return result
+
+
+def count_statements(engine):
+    """Count executed statements toward the decorated calls in progress"""
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        metrics.count('statements')
+
+
+def sqlite_transactions(engine):
+    """Let sqlalchemy emit BEGIN for sqlite so that SAVEPOINTs work
+
+    pysqlite begins transactions lazily before DML statements, so releasing
+    a SAVEPOINT that was opened first would commit the whole transaction.
+
+    """
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        # Disable pysqlite's own transaction handling
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        conn.execute('BEGIN')
+
+
+def is_memory_url(url):
+    """Return True when the URL refers to an in-memory sqlite database"""
+    url = make_url(url)
+    return (url.drivername.startswith('sqlite') and
+            url.database in (None, '', ':memory:'))
+
+
+class EngineRegistry(object):
+    """Share engines and their connection pools between schemas
+
+    Engines are keyed by URL and engine options so that binding many
+    short-lived schemas to the same database reuses a single pool rather
+    than creating and disposing an engine for every context.
+
+    """
+
+    def __init__(self, factory=engine):
+        self.factory = factory
+        self.engines = {}
+        self.hits = 0
+        self.creates = 0
+        self.disposes = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(url, **kwargs):
+        """Return the registry key for a URL and its engine options"""
+        options = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+        return (str(url), options)
+
+    def get(self, url, **kwargs):
+        """Return the shared engine for a URL, creating it when needed"""
+        key = self.key(url, **kwargs)
+        with self._lock:
+            try:
+                result = self.engines[key]
+                self.hits += 1
+            except KeyError:
+                result = self.engines[key] = self.factory(url, **kwargs)
+                self.creates += 1
+        return result
+
+    def find(self, url, **kwargs):
+        """Return the shared engine for a URL without creating it"""
+        with self._lock:
+            return self.engines.get(self.key(url, **kwargs))
+
+    def owns(self, engine):
+        """Is the engine managed by this registry?"""
+        with self._lock:
+            return any(engine is e for e in self.engines.values())
+
+    def dispose(self, url, **kwargs):
+        """Dispose of a single shared engine and forget about it"""
+        key = self.key(url, **kwargs)
+        with self._lock:
+            engine = self.engines.pop(key, None)
+            if engine is None:
+                return False
+            engine.dispose()
+            self.disposes += 1
+        return True
+
+    def shutdown(self):
+        """Dispose of all shared engines"""
+        with self._lock:
+            engines = list(self.engines.values())
+            self.engines.clear()
+            for engine in engines:
+                engine.dispose()
+                self.disposes += 1
+        return len(engines)
+
+    def stats(self):
+        """Return a dict of registry counters"""
+        with self._lock:
+            return {
+                'engines': len(self.engines),
+                'hits': self.hits,
+                'creates': self.creates,
+                'disposes': self.disposes,
+            }
+
+
+# The process-wide engine registry used by Schema.bind_url()
+registry = EngineRegistry()
+
+
+def shared_engine(url, strategy=DEFAULT_STRATEGY, **kwargs):
+    """Return a pooled engine from the process-wide registry"""
+    return registry.get(url, strategy=strategy, **kwargs)
+
+
+def shutdown():
+    """Dispose of all pooled engines, e.g. before exiting or forking"""
+    return registry.shutdown()
+
+
+def in_transaction(engine):
+    """Has the current thread begun a transaction on a thread-local engine?
+
+    Every schema bound to a thread-local engine shares the thread's
+    connection, so a second context would join the first one's transaction.
+
+    """
+    return (isinstance(engine, TLEngine) and
+            bool(getattr(engine._connections, 'trans', None)))
 
 
 class Schema(object):
 
     def __init__(self):
         self.engine = None
+        self.shared = False
         self.metadata = MetaData()
         self.tables = {}
 
     def add_table(self, name, *columns, **kwargs):
-        self.tables[name] = Table(name, self.metadata, *columns, **kwargs)
+        """Define a table
+
+        `deferred` names heavy columns, e.g. large TEXT or BLOB columns,
+        that are only selected when they are requested by name.
+        The table's compact row class is generated up front;
+        see :mod:`skeletor.db.rows`.
+
+        """
+        deferred = frozenset(kwargs.pop('deferred', ()))
+        table = Table(name, self.metadata, *columns, **kwargs)
+        if deferred:
+            unknown = deferred.difference(table.c.keys())
+            if unknown:
+                raise KeyError('unknown deferred columns in %s: %s'
+                               % (name, ', '.join(sorted(unknown))))
+            table.info['deferred'] = deferred
+            table.info['default_columns'] = tuple(
+                column.name for column in table.c
+                if column.name not in deferred)
+        rows.row_class(table)
+        self.tables[name] = table
+
+    def add_index(self, table_name, *columns, **kwargs):
+        """Define an index on a table's columns
+
+        `lower=True` indexes `lower(column)` expressions, which serve the
+        case-insensitive lookups made by :func:`skeletor.db.sql.iwhere`.
+        The index is named after the table and columns unless `name` is
+        given.  Other keyword arguments, e.g. `unique`, are passed to
+        :class:`sqlalchemy.Index`.  Returns the index.
+
+        """
+        lower = kwargs.pop('lower', False)
+        table = self.tables[table_name]
+        exprs = [getattr(table.c, column) for column in columns]
+        parts = ['ix', table_name]
+        if lower:
+            exprs = [func.lower(expr) for expr in exprs]
+            parts.append('lower')
+        parts.extend(columns)
+        name = kwargs.pop('name', None) or '_'.join(parts)
+        return Index(name, *exprs, **kwargs)
 
     def __getitem__(self, name):
         """For convenience so that subclasses can say schema[table]"""
@@ -28,23 +222,63 @@ class Schema(object):
         """For convenience so that subclasses can say schema.table"""
         return self.tables[name]
 
-    def bind_url(self, url, strategy=DEFAULT_STRATEGY):
-        return self.bind(engine(url, strategy=strategy))
+    def bind_url(self, url, strategy=DEFAULT_STRATEGY, shared=True,
+                 pool=None):
+        """Bind to a URL, reusing a pooled engine when `shared` is True
 
-    def bind(self, engine):
+        In-memory sqlite databases are never shared because every
+        engine refers to a distinct database.
+
+        `pool` is a dict of pool options, e.g. `{'size': 10}`; see
+        :func:`skeletor.db.pool.options` and :func:`skeletor.db.pool.config`.
+        Shared engines are keyed by their pool options too.
+
+        A private engine is used when the current thread already has a
+        transaction open on the shared thread-local engine, e.g. when a
+        mutator calls a mutator bound to another creator.  The contexts
+        then commit and roll back independently.
+
+        """
+        kwargs = pool_mod.options(pool)
+        if shared and not is_memory_url(url):
+            result = shared_engine(url, strategy=strategy, **kwargs)
+            if not in_transaction(result):
+                return self.bind(result, shared=True)
+        return self.bind(engine(url, strategy=strategy, **kwargs))
+
+    def bind(self, engine, shared=False):
         """Bind a sqlalchemy engine to the table metadata"""
         self.engine = engine
+        self.shared = shared
         self.metadata.bind = engine
         return self
 
     def unbind(self):
-        """Unbind the metadata"""
+        """Unbind the metadata
+
+        Private engines are disposed.  Shared engines are left intact so
+        that their pooled connections can be reused by other schemas.
+
+        """
         self.metadata.bind = None
-        if self.engine is not None:
+        if self.engine is not None and not self.shared:
             self.engine.dispose()
         self.engine = None
+        self.shared = False
         return self
 
+    def pool_stats(self):
+        """Return the bound engine's connection pool statistics
+
+        See :class:`skeletor.db.pool.PoolStats`.  Shared engines report
+        the statistics of every schema bound to them.  Returns None when
+        the schema is unbound.
+
+        """
+        if self.engine is None:
+            return None
+        return pool_mod.stats(self.engine)
+
     def create(self):
         """Create missing tables"""
         self.metadata.create_all()
@@ -59,6 +293,14 @@ class Schema(object):
             dialect = self.engine.name
         return dialect
 
+    def begin(self):
+        """Begin a transaction"""
+        self.engine.begin()
+
+    def begin_nested(self):
+        """Begin a nested transaction using a SAVEPOINT"""
+        self.engine.begin_nested()
+
     def commit(self):
         """Commit a transaction"""
         self.engine.commit()
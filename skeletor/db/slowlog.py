@@ -0,0 +1,182 @@
+"""Log slow SQL statements
+
+Engines created by :func:`skeletor.db.schema.engine` time every statement
+once the slow-query log is enabled.  Statements that take longer than the
+threshold are logged with their bound parameters redacted, the decorated
+function that issued them, and their duration.
+
+.. sourcecode:: python
+
+    from skeletor.db import slowlog
+
+    slowlog.enable(threshold=0.25, sample_rate=0.1, max_per_interval=100)
+
+Sampling caps the log volume: `sample_rate` is the fraction of slow
+statements that are logged and `max_per_interval` limits the number of
+messages logged every `interval` seconds.
+
+The calling function is taken from :mod:`skeletor.util.metrics` when
+metrics are enabled.  Otherwise the innermost caller outside of
+sqlalchemy and skeletor is reported.
+
+"""
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+
+from skeletor.core import log as log_mod
+from skeletor.util import metrics
+
+
+# Statements slower than this many seconds are logged by default
+DEFAULT_THRESHOLD = 0.5
+
+# Execution context attribute that holds a statement's start time
+START_TIME = '_skeletor_slowlog_start'
+
+# Modules skipped when looking for the calling function
+INTERNAL_MODULES = ('sqlalchemy.', 'skeletor.db.', 'skeletor.util.')
+
+_state = {'log': None}
+
+
+class SlowQueryLog(object):
+    """Decide which slow statements to log and log them
+
+    :param threshold: minimum duration in seconds.
+    :param sample_rate: fraction of slow statements to log.
+    :param max_per_interval: maximum messages per interval; None for no cap.
+    :param interval: length of the rate-limiting interval in seconds.
+    :param redact: replace bound parameter values with placeholders.
+
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, sample_rate=1.0,
+                 max_per_interval=None, interval=60.0, redact=True,
+                 logger=None, clock=time.time, random=random.random):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self.redact = redact
+        self.logger = logger or log_mod.logger(__name__)
+        self.clock = clock
+        self.random = random
+        # Counters for monitoring
+        self.slow = 0
+        self.logged = 0
+        self.dropped = 0
+        self._window_start = None
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, statement, parameters, duration, executemany=False):
+        """Log a statement if it is slow and survives sampling"""
+        if duration < self.threshold:
+            return False
+        if not self.sample():
+            return False
+        if self.redact:
+            parameters = redact(parameters, executemany=executemany)
+        self.logger.warning('slow query: %.3fs in %s: %s; parameters: %r',
+                            duration, caller(), statement, parameters)
+        return True
+
+    def sample(self):
+        """Record a slow statement and return True if it should be logged"""
+        with self._lock:
+            self.slow += 1
+            if self.sample_rate < 1.0 and self.random() >= self.sample_rate:
+                self.dropped += 1
+                return False
+            if self.max_per_interval is not None:
+                now = self.clock()
+                if (self._window_start is None or
+                        now - self._window_start >= self.interval):
+                    self._window_start = now
+                    self._window_count = 0
+                if self._window_count >= self.max_per_interval:
+                    self.dropped += 1
+                    return False
+                self._window_count += 1
+            self.logged += 1
+            return True
+
+    def stats(self):
+        return {
+            'slow': self.slow,
+            'logged': self.logged,
+            'dropped': self.dropped,
+        }
+
+
+def redact(parameters, executemany=False):
+    """Replace bound parameter values with '?' placeholders
+
+    Parameter names are kept so that the statement can still be read.
+    Only the first parameter set of an executemany() call is shown.
+
+    """
+    if executemany and isinstance(parameters, (list, tuple)):
+        if not parameters:
+            return parameters
+        return [redact(parameters[0]), '... %d rows' % len(parameters)]
+    if isinstance(parameters, dict):
+        return dict((key, '?') for key in parameters)
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)('?' for value in parameters)
+    return parameters
+
+
+def caller():
+    """Return the name of the decorated function issuing a statement"""
+    events = metrics.events()
+    if events:
+        return events[-1].name
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith(INTERNAL_MODULES):
+            return module + '.' + frame.f_code.co_name
+        frame = frame.f_back
+    return '<unknown>'
+
+
+def enable(threshold=DEFAULT_THRESHOLD, **kwargs):
+    """Start logging slow statements and return the :class:`SlowQueryLog`"""
+    result = _state['log'] = SlowQueryLog(threshold=threshold, **kwargs)
+    return result
+
+
+def disable():
+    _state['log'] = None
+
+
+def current():
+    """Return the active :class:`SlowQueryLog`, or None when disabled"""
+    return _state['log']
+
+
+def install(engine):
+    """Time statements executed by an engine for the slow-query log"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if context is not None and _state['log'] is not None:
+            setattr(context, START_TIME, time.time())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        start = getattr(context, START_TIME, None)
+        if start is None:
+            return
+        # Execution contexts can run more than one statement
+        setattr(context, START_TIME, None)
+        slow_log = _state['log']
+        if slow_log is not None:
+            slow_log.observe(statement, parameters, time.time() - start,
+                             executemany=executemany)
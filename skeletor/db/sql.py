@@ -1,20 +1,71 @@
+import threading
+from collections import OrderedDict
 from functools import reduce
+from itertools import groupby
+from itertools import islice
 
 from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import exists
+from sqlalchemy import func
+from sqlalchemy import literal_column
+from sqlalchemy import or_
+from sqlalchemy import Table
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine.threadlocal import TLEngine
+from sqlalchemy.exc import SQLAlchemyError
 
+from skeletor.db import advisor
+from skeletor.db import arrays
+from skeletor.db import rows as rows_mod
 
-def rowdict(row):
+
+# Number of rows sent per executemany() call by the bulk helpers
+DEFAULT_BATCH_SIZE = 1000
+
+# Number of rows buffered per fetchmany() call by the iterators
+DEFAULT_FETCH_SIZE = 1000
+
+# Number of rows returned per page by paginate()
+DEFAULT_PAGE_SIZE = 100
+
+# Maximum number of compiled statements held by the statement cache
+DEFAULT_CACHE_SIZE = 256
+
+# Pass as `columns` to select every column, including deferred columns
+ALL_COLUMNS = '*'
+
+
+def rowdict(row, row_class=None):
+    """Convert a row into a dict, or into a `row_class` instance
+
+    `row_class` is a :class:`skeletor.db.rows.Row` class whose fields
+    match the row's columns.
+
+    """
     if row is None:
         return None
+    if row_class is not None:
+        return row_class(*row)
     return dict(row.items())
 
 
-def rowdicts(rows):
+def rowdicts(rows, row_class=None):
     if rows is None:
         return None
+    if row_class is not None:
+        return [row_class(*r) for r in rows]
     return [dict(r) for r in rows]
 
 
+def iterdicts(rows):
+    """Lazily convert rows into dicts"""
+    for row in rows:
+        yield dict(row)
+
+
 def exec_fetchall(expr):
     return expr.execute().fetchall()
 
@@ -23,24 +74,141 @@ def exec_fetchone(expr):
     return expr.execute().fetchone()
 
 
-def fetchall(table):
-    return exec_fetchall(table.select())
-
-
-def fetchone(table, where_expr):
-    """Select one row from a table filtered by a `where` expression"""
-    expr = table.select().where(where_expr)
-    return rowdict(exec_fetchone(expr))
+def exec_iterall(expr, fetch_size=DEFAULT_FETCH_SIZE):
+    """Execute an expression and yield its rows lazily
+
+    Results are streamed using a server-side cursor on dialects that
+    support one and are fetched `fetch_size` rows at a time, so memory
+    use is bounded by the fetch size rather than the size of the result.
+
+    """
+    result = expr.execution_options(stream_results=True).execute()
+    try:
+        while True:
+            rows = result.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        result.close()
+
+
+def deferred_columns(table):
+    """Return the names of a table's deferred columns
+
+    Deferred columns are excluded from selects unless they are named in
+    `columns`.  See :func:`skeletor.db.schema.Schema.add_table`.
+
+    """
+    return table.info.get('deferred', frozenset())
+
+
+def select_columns(table, columns=None, required=()):
+    """Return a select() of the named columns
+
+    `columns` is a sequence of column names.  None selects every column
+    except deferred columns and :data:`ALL_COLUMNS` selects every column.
+    The `required` columns are always selected.
+
+    """
+    if columns is None:
+        columns = table.info.get('default_columns')
+    elif columns == ALL_COLUMNS:
+        columns = None
+    if columns is None:
+        return table.select()
+    names = list(columns)
+    for name in required:
+        if name not in names:
+            names.append(name)
+    return select([getattr(table.c, name) for name in names])
+
+
+def slotted_row_class(table, columns=None):
+    """Return the compact row class for the columns selected from a table
+
+    Returns None, meaning dicts, when the columns cannot be used as slots.
+
+    """
+    if columns == ALL_COLUMNS:
+        columns = table.c.keys()
+    return rows_mod.row_class(table, columns)
+
+
+def fetchall(table, columns=None):
+    return exec_fetchall(select_columns(table, columns=columns))
+
+
+def iter_all(table, fetch_size=DEFAULT_FETCH_SIZE, dicts=False,
+             columns=None):
+    """Yield all rows from a table lazily"""
+    expr = select_columns(table, columns=columns)
+    rows = exec_iterall(expr, fetch_size=fetch_size)
+    if dicts:
+        rows = iterdicts(rows)
+    return rows
+
+
+def fetch_columns(expr, columns=None, fetch_size=DEFAULT_FETCH_SIZE,
+                  use_numpy=None):
+    """Read query results into one array per column
+
+    `expr` is a table or a select expression; `columns` optionally names
+    the columns to read.  Rows are fetched `fetch_size` at a time and are
+    appended to typed buffers without creating a dict per row.  Returns an
+    OrderedDict mapping column names to NumPy arrays, or to
+    :class:`array.array` buffers when NumPy is not installed.
+    See :mod:`skeletor.db.arrays`.
+
+    """
+    if isinstance(expr, Table):
+        expr = select_columns(expr, columns=columns)
+    elif columns is not None:
+        expr = expr.with_only_columns(
+            [column for name in columns for column in expr.inner_columns
+             if column.name == name])
+    selected = list(expr.inner_columns)
+    builders = [arrays.builder(column.type, use_numpy=use_numpy)
+                for column in selected]
+    result = expr.execution_options(stream_results=True).execute()
+    try:
+        while True:
+            rows = result.fetchmany(fetch_size)
+            if not rows:
+                break
+            for column_builder, values in zip(builders, zip(*rows)):
+                column_builder.extend(values)
+    finally:
+        result.close()
+    return OrderedDict((column.name, column_builder.finish())
+                       for column, column_builder in zip(selected, builders))
+
+
+def fetchone(table, where_expr, columns=None, slots=False):
+    """Select one row from a table filtered by a `where` expression
+
+    The row is returned as a dict, or as a compact
+    :class:`skeletor.db.rows.Row` when `slots` is True.
+
+    """
+    expr = select_columns(table, columns=columns).where(where_expr)
+    row_class = None
+    if slots:
+        row_class = slotted_row_class(table, columns=columns)
+    return rowdict(exec_fetchone(expr), row_class=row_class)
 
 
 def where(table, operator=and_, **values):
     """Return a `where` expression to combine column=value criteria"""
+    advisor.record(table, values, match_any=operator is or_)
     # Create a list of (column == value) filters and combine them
     return reduce_filters(table, eq_column, operator=operator, **values)
 
 
 def iwhere(table, operator=and_, **values):
     """Return a `where` expression to combine column ILIKE value criteria"""
+    advisor.record(table, values, lower=True, match_any=operator is or_)
     # Create a list of (column ILIKE value) filters and combine them
     return reduce_filters(table, ilike_column, operator=operator, **values)
 
@@ -51,8 +219,13 @@ def eq_column(table, column, value):
 
 
 def ilike_column(table, column, value):
-    """column ILIKE value"""
-    return getattr(table.c, column).ilike(value)
+    """column ILIKE value
+
+    This is expressed as `lower(column) LIKE lower(value)` on every
+    dialect so that `lower(column)` indexes can serve the lookup.
+
+    """
+    return func.lower(getattr(table.c, column)).like(func.lower(value))
 
 
 def reduce_filters(table, fn, operator=and_, **values):
@@ -69,19 +242,314 @@ def reduce_filters(table, fn, operator=and_, **values):
     return expr
 
 
-def select_one(table, where=where, operator=and_, **values):
-    """Select one row filtered by `values` column=value criteria"""
+class StatementCache(object):
+    """LRU cache of compiled statements
+
+    Statements are compiled with bound parameters in place of values so
+    that repeated lookups against the same columns skip building the
+    expression tree and compiling it.
+
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compile_statement):
+        """Return the cached statement, compiling it on a miss"""
+        with self._lock:
+            try:
+                statement = self._statements.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._statements[key] = statement
+                self.hits += 1
+                return statement
+        statement = compile_statement()
+        with self._lock:
+            self.misses += 1
+            self._statements[key] = statement
+            while len(self._statements) > self.maxsize:
+                self._statements.popitem(last=False)
+        return statement
+
+    def clear(self):
+        """Forget all cached statements"""
+        with self._lock:
+            self._statements.clear()
+
+    def stats(self):
+        """Return a dict of cache counters"""
+        with self._lock:
+            return {
+                'size': len(self._statements),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# The process-wide statement cache used by select_one() and select_all()
+statements = StatementCache()
+
+# Filter functions for the `where` functions that can be cached
+cached_filters = {
+    where: eq_column,
+    iwhere: ilike_column,
+}
+
+
+def cached_select(table, where=where, operator=and_, columns=None,
+                  **values):
+    """Return a compiled select statement from the statement cache
+
+    The statement's parameters are named after the columns in `values`.
+    Returns None when the query cannot be cached, e.g. when a custom
+    `where` function is used or a value is None, which must compile to
+    `IS NULL` rather than a bound parameter.
+
+    """
+    fn = cached_filters.get(where)
+    bind = table.bind
+    if fn is None or bind is None or not values:
+        return None
+    if any(value is None for value in values.values()):
+        return None
+    names = tuple(sorted(values))
+    advisor.record(table, names, lower=fn is ilike_column,
+                   match_any=operator is or_)
+    if columns is not None and columns != ALL_COLUMNS:
+        columns = tuple(columns)
+    # Statements are keyed by URL and dialect rather than by engine so that
+    # the cache does not keep unbound engines alive.  The table's columns
+    # are part of the key because schemas bound to the same URL may define
+    # tables with the same name differently.
+    dialect = bind.dialect
+    key = (str(bind.url), dialect.name, dialect.driver, table.name,
+           table.schema, tuple(table.c.keys()), names, operator, fn, columns)
+    return statements.get(
+        key, lambda: compile_select(table, fn, operator, names, dialect,
+                                    columns=columns))
+
+
+def compile_select(table, fn, operator, names, dialect, columns=None):
+    """Compile a select statement filtered by bound column parameters"""
+    params = dict((name, bindparam(name)) for name in names)
+    where_expr = reduce_filters(table, fn, operator=operator, **params)
+    expr = select_columns(table, columns=columns)
+    return expr.where(where_expr).compile(dialect=dialect)
+
+
+def select_one(table, where=where, operator=and_, columns=None,
+               slots=False, **values):
+    """Select one row filtered by `values` column=value criteria
+
+    See :func:`fetchone` for `slots`.
+
+    """
+    statement = cached_select(table, where=where, operator=operator,
+                              columns=columns, **values)
+    if statement is not None:
+        row_class = None
+        if slots:
+            row_class = slotted_row_class(table, columns=columns)
+        row = table.bind.execute(statement, values).fetchone()
+        return rowdict(row, row_class=row_class)
     where_expr = where(table, operator=operator, **values)
-    return fetchone(table, where_expr)
+    return fetchone(table, where_expr, columns=columns, slots=slots)
 
 
-def select_all(table, where=where, operator=and_, **values):
+def select_all(table, where=where, operator=and_, columns=None, **values):
     """Select all rows filtered by `values` column=value criteria"""
+    statement = cached_select(table, where=where, operator=operator,
+                              columns=columns, **values)
+    if statement is not None:
+        return table.bind.execute(statement, values).fetchall()
     where_expr = where(table, operator=operator, **values)
-    expr = table.select().where(where_expr)
+    expr = select_columns(table, columns=columns).where(where_expr)
     return exec_fetchall(expr)
 
 
+def iter_select(table, where=where, operator=and_,
+                fetch_size=DEFAULT_FETCH_SIZE, dicts=False, columns=None,
+                **values):
+    """Yield rows filtered by `values` column=value criteria lazily"""
+    where_expr = where(table, operator=operator, **values)
+    expr = select_columns(table, columns=columns).where(where_expr)
+    rows = exec_iterall(expr, fetch_size=fetch_size)
+    if dicts:
+        rows = iterdicts(rows)
+    return rows
+
+
+def order_columns(table, order_by=None):
+    """Return the columns for a keyset ordering
+
+    `order_by` may be a column name or a sequence of names and defaults
+    to the table's primary key.  The key should be unique, e.g. an index
+    that ends with the primary key, so that rows are never skipped.
+
+    """
+    if order_by is None:
+        return list(table.primary_key.columns)
+    if isinstance(order_by, (list, tuple)):
+        return [getattr(table.c, name) for name in order_by]
+    return [getattr(table.c, order_by)]
+
+
+def page_key(row, order_by):
+    """Return the keyset cursor for a row given its ordering columns"""
+    values = tuple(row[column.name] for column in order_by)
+    if len(values) == 1:
+        return values[0]
+    return values
+
+
+def seek(columns, after, descending=False):
+    """Return a `where` expression selecting rows beyond the `after` key
+
+    The comparison is expanded into `(a > x) OR (a = x AND b > y)` form
+    rather than using row values so that it works on every dialect.
+
+    """
+    if len(columns) == 1:
+        after = (after,)
+    filters = []
+    for idx, column in enumerate(columns):
+        if descending:
+            expr = column < after[idx]
+        else:
+            expr = column > after[idx]
+        equal = [columns[i] == after[i] for i in range(idx)]
+        if equal:
+            expr = and_(*(equal + [expr]))
+        filters.append(expr)
+    return reduce(or_, filters)
+
+
+def paginate(table, order_by=None, after=None, limit=DEFAULT_PAGE_SIZE,
+             descending=False, where=where, operator=and_, columns=None,
+             **values):
+    """Return a page of rows using keyset (seek) pagination
+
+    `after` is the :func:`page_key` of the last row from the previous page,
+    or None for the first page.  Unlike OFFSET, seeking on an indexed key
+    keeps the cost of deep pages proportional to the page size.
+    The ordering columns are always selected.
+
+    """
+    order = order_columns(table, order_by=order_by)
+    expr = select_columns(table, columns=columns,
+                          required=[column.name for column in order])
+    if values:
+        expr = expr.where(where(table, operator=operator, **values))
+    if after is not None:
+        expr = expr.where(seek(order, after, descending=descending))
+    if descending:
+        expr = expr.order_by(*[column.desc() for column in order])
+    else:
+        expr = expr.order_by(*order)
+    return exec_fetchall(expr.limit(limit))
+
+
+def select_ids(table, ids, chunk_size=DEFAULT_BATCH_SIZE, columns=None,
+               slots=False):
+    """Return a dict mapping ids to rows using chunked `IN (...)` queries
+
+    Ids that do not exist are absent from the result.  See
+    :func:`fetchone` for `slots`.
+
+    """
+    rows = {}
+    select_expr = select_columns(table, columns=columns, required=('id',))
+    row_class = None
+    if slots:
+        row_class = rows_mod.row_class(
+            table, [column.name for column in select_expr.inner_columns])
+    for chunk in chunks(ids, chunk_size):
+        expr = select_expr.where(table.c.id.in_(chunk))
+        for row in exec_fetchall(expr):
+            rows[row['id']] = rowdict(row, row_class=row_class)
+    return rows
+
+
+# Aggregate functions supported by aggregate(), in result order
+AGGREGATES = ('count', 'sum', 'min', 'max', 'avg')
+
+
+def filtered(table, expr, where=where, operator=and_, **values):
+    """Apply `values` column=value criteria to an expression, if any"""
+    if values:
+        expr = expr.where(where(table, operator=operator, **values))
+    return expr
+
+
+def count_rows(table, where=where, operator=and_, **values):
+    """Return the number of rows matching `values` criteria"""
+    expr = select([func.count()]).select_from(table)
+    expr = filtered(table, expr, where=where, operator=operator, **values)
+    return expr.execute().scalar()
+
+
+def row_exists(table, where=where, operator=and_, **values):
+    """Return True when a row matches `values` criteria"""
+    expr = select([literal_column('1')]).select_from(table)
+    expr = filtered(table, expr, where=where, operator=operator, **values)
+    return bool(table.bind.execute(select([exists(expr)])).scalar())
+
+
+def aggregate_columns(table, name, columns):
+    """Return aggregate expressions for one of the :data:`AGGREGATES`"""
+    if name == 'count':
+        if columns is True:
+            return [func.count()]
+        if not columns:
+            return []
+    if columns is None:
+        return []
+    if not isinstance(columns, (list, tuple)):
+        columns = [columns]
+    fn = getattr(func, name)
+    return [fn(getattr(table.c, column)) for column in columns]
+
+
+def aggregate(table, group_by=None, where=where, operator=and_,
+              count=False, sum=None, min=None, max=None, avg=None,
+              **values):
+    """Compute aggregates server-side, optionally grouped by columns
+
+    `sum`, `min`, `max` and `avg` name a column or a sequence of columns
+    and `count=True` counts rows.  Each result is a tuple of the
+    `group_by` values followed by the aggregates in :data:`AGGREGATES`
+    order.  Returns a list of tuples ordered by the `group_by` columns,
+    or a single tuple when `group_by` is None.
+
+    """
+    options = {'count': count, 'sum': sum, 'min': min,
+               'max': max, 'avg': avg}
+    exprs = []
+    for name in AGGREGATES:
+        exprs.extend(aggregate_columns(table, name, options[name]))
+    if not exprs:
+        raise ValueError('aggregate() requires at least one aggregate')
+    if group_by is None:
+        groups = []
+    elif isinstance(group_by, (list, tuple)):
+        groups = [getattr(table.c, column) for column in group_by]
+    else:
+        groups = [getattr(table.c, group_by)]
+    expr = select(groups + exprs).select_from(table)
+    expr = filtered(table, expr, where=where, operator=operator, **values)
+    if not groups:
+        return tuple(expr.execute().fetchone())
+    expr = expr.group_by(*groups).order_by(*groups)
+    return [tuple(row) for row in exec_fetchall(expr)]
+
+
 def update_values(table, where_expr, **values):
     """Return an update().values(...) expression for the given table"""
     return table.update().values(**values).where(where_expr)
@@ -96,3 +564,285 @@ def delete(table, operator=and_, where=where, **values):
     """Delete rows from a table based on the filter values"""
     where_expr = where(table, operator=operator, **values)
     return table.delete(where_expr).execute()
+
+
+def chunks(items, size):
+    """Yield lists of at most `size` items from an iterable"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def column_runs(rows, columns=lambda values: tuple(sorted(values))):
+    """Yield `(columns, rows)` for each run of rows that set the same columns
+
+    Only consecutive rows are grouped so that rows stay in order and later
+    values for the same row still win.
+
+    """
+    for key, group in groupby(rows, columns):
+        yield key, list(group)
+
+
+def connect(bind):
+    """Return a connection from an engine
+
+    Thread-local engines return the thread's current connection so that
+    statements participate in any transaction that is already underway.
+
+    """
+    if isinstance(bind, TLEngine):
+        return bind.contextual_connect()
+    return bind.connect()
+
+
+def supports_returning(bind):
+    """Can the bound dialect return generated keys from a bulk insert?"""
+    dialect = bind.dialect
+    return bool(dialect.implicit_returning and
+                dialect.supports_multivalues_insert)
+
+
+class BulkResult(object):
+    """Summary of a batched bulk operation
+
+    `count` is the number of rows that were written, `ids` is the list of
+    generated primary keys when they were returned by the database, and
+    `errors` contains a `(batch_index, rows, exception)` tuple for every
+    batch that failed.  `rows` is populated by :func:`Table.new_many`.
+
+    """
+
+    def __init__(self, returning=False):
+        self.count = 0
+        self.ids = [] if returning else None
+        self.rows = None
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def execute_batches(conn, rows, batch_size, execute, result):
+    """Call `execute(conn, batch)` for each batch within one transaction
+
+    Each batch runs inside a SAVEPOINT so that a failing batch is rolled
+    back and reported in the result without aborting the whole operation.
+    `execute` returns the batch's generated ids when `result.ids` is
+    being collected.  The connection is closed when done.
+
+    """
+    trans = conn.begin()
+    try:
+        for index, batch in enumerate(chunks(rows, batch_size)):
+            savepoint = conn.begin_nested()
+            try:
+                ids = execute(conn, batch)
+                savepoint.commit()
+            except SQLAlchemyError as e:
+                savepoint.rollback()
+                result.errors.append((index, batch, e))
+                continue
+            result.count += len(batch)
+            if result.ids is not None:
+                result.ids.extend(ids)
+        trans.commit()
+    except BaseException:
+        trans.rollback()
+        raise
+    finally:
+        conn.close()
+    return result
+
+
+def insert_many(table, rows, batch_size=DEFAULT_BATCH_SIZE, returning=False):
+    """Insert rows in batches using executemany() within one transaction
+
+    Failing batches are reported in the result without aborting the load.
+    Generated ids are collected when `returning` is True and the dialect
+    supports RETURNING.
+
+    """
+    # Dialect capabilities are known once the engine has connected
+    conn = connect(table.bind)
+    returning = returning and supports_returning(conn)
+    result = BulkResult(returning=returning)
+    if returning:
+        keys = list(table.primary_key.columns)
+
+        def execute(conn, batch):
+            expr = table.insert().values(batch).returning(*keys)
+            return [row[0] for row in conn.execute(expr)]
+    else:
+        expr = table.insert()
+
+        def execute(conn, batch):
+            conn.execute(expr, batch)
+
+    return execute_batches(conn, rows, batch_size, execute, result)
+
+
+def update_expr(table, columns):
+    """Return an UPDATE by id with bound parameters for executemany()
+
+    Parameters are prefixed with "_" because sqlalchemy reserves the
+    column names for the SET clause.
+
+    """
+    values = dict((column, bindparam('_' + column)) for column in columns)
+    return table.update().where(table.c.id == bindparam('_id')).values(values)
+
+
+def update_many(table, updates, batch_size=DEFAULT_BATCH_SIZE):
+    """Update rows by id in batches within one transaction
+
+    `updates` is a sequence of `(id, values)` pairs.  Consecutive updates
+    that set the same columns share a statement and are sent using
+    executemany().  Updates are applied in order, so later updates to the
+    same row win.  Returns a :class:`BulkResult`; failing batches are
+    reported in its errors.
+
+    """
+    def execute(conn, batch):
+        for columns, group in column_runs(batch, update_columns):
+            params = []
+            for row_id, values in group:
+                bound = dict(('_' + k, v) for k, v in values.items())
+                bound['_id'] = row_id
+                params.append(bound)
+            conn.execute(update_expr(table, columns), params)
+
+    conn = connect(table.bind)
+    return execute_batches(conn, updates, batch_size, execute, BulkResult())
+
+
+def update_columns(update):
+    """Return the sorted columns set by an `(id, values)` pair"""
+    return tuple(sorted(update[1]))
+
+
+def delete_ids(table, ids, chunk_size=DEFAULT_BATCH_SIZE):
+    """Delete rows by id using chunked `IN (...)` queries
+
+    All chunks are deleted within one transaction.  Returns the number of
+    deleted rows.
+
+    """
+    count = 0
+    conn = connect(table.bind)
+    trans = conn.begin()
+    try:
+        for chunk in chunks(ids, chunk_size):
+            expr = table.delete().where(table.c.id.in_(chunk))
+            count += conn.execute(expr).rowcount
+        trans.commit()
+    except BaseException:
+        trans.rollback()
+        raise
+    finally:
+        conn.close()
+    return count
+
+
+def upsert_expr(table, conflict_columns, columns, dialect):
+    """Return an "insert or update" statement for dialects with native support
+
+    PostgreSQL uses `ON CONFLICT ... DO UPDATE` and MySQL uses
+    `ON DUPLICATE KEY UPDATE`.  Returns None for other dialects.
+
+    """
+    updates = [c for c in columns if c not in conflict_columns]
+    if dialect == 'postgresql':
+        expr = postgresql.insert(table)
+        if not updates:
+            return expr.on_conflict_do_nothing(
+                index_elements=list(conflict_columns))
+        return expr.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_=dict((c, expr.excluded[c]) for c in updates))
+    if dialect == 'mysql':
+        expr = mysql.insert(table)
+        # Assigning a conflict column to itself leaves the row as-is
+        updates = updates or list(conflict_columns)
+        return expr.on_duplicate_key_update(
+            **dict((c, expr.inserted[c]) for c in updates))
+    return None
+
+
+def upsert_row(conn, table, conflict_columns, values):
+    """Insert or update a single row on dialects without native upserts
+
+    The row is looked up by its conflict columns and then updated, or
+    inserted when it does not exist, so constraint violations raise.
+    sqlite's `INSERT OR IGNORE` is avoided because it also ignores NOT
+    NULL, CHECK and unique violations on other columns, and
+    `INSERT OR REPLACE` deletes the existing row, which assigns a new id.
+
+    """
+    where_expr = where(table, **dict((c, values[c]) for c in conflict_columns))
+    expr = select([literal_column('1')]).where(where_expr).limit(1)
+    if conn.execute(expr).fetchone() is None:
+        conn.execute(table.insert().values(**values))
+        return
+    updates = dict((k, v) for k, v in values.items()
+                   if k not in conflict_columns)
+    if updates:
+        conn.execute(update_values(table, where_expr, **updates))
+
+
+def upsert(table, conflict_columns, values, dialect=None):
+    """Insert a row, or update it when it conflicts with an existing row
+
+    `conflict_columns` names the unique columns used to detect conflicts.
+    The resulting row is returned.  PostgreSQL does this in a single
+    statement using RETURNING; other dialects select the row afterwards.
+
+    """
+    conn = connect(table.bind)
+    try:
+        if dialect is None:
+            dialect = conn.dialect.name
+        expr = upsert_expr(table, conflict_columns, values, dialect)
+        if dialect == 'postgresql':
+            expr = expr.values(**values).returning(*table.c)
+            row = conn.execute(expr).fetchone()
+            if row is not None:
+                return rowdict(row)
+        elif expr is not None:
+            conn.execute(expr.values(**values))
+        else:
+            upsert_row(conn, table, conflict_columns, values)
+        expr = table.select().where(
+            where(table, **dict((c, values[c]) for c in conflict_columns)))
+        return rowdict(conn.execute(expr).fetchone())
+    finally:
+        conn.close()
+
+
+def upsert_many(table, conflict_columns, rows,
+                batch_size=DEFAULT_BATCH_SIZE, dialect=None):
+    """Insert or update rows in batches within one transaction
+
+    Rows may set different columns; consecutive rows that set the same
+    columns share a statement.  Returns a :class:`BulkResult`; failing
+    batches are reported in its errors.
+
+    """
+    conn = connect(table.bind)
+    if dialect is None:
+        dialect = conn.dialect.name
+
+    def execute(conn, batch):
+        for columns, group in column_runs(batch):
+            expr = upsert_expr(table, conflict_columns, columns, dialect)
+            if expr is not None:
+                conn.execute(expr, group)
+            else:
+                for values in group:
+                    upsert_row(conn, table, conflict_columns, values)
+
+    return execute_batches(conn, rows, batch_size, execute, BulkResult())
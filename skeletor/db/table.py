@@ -2,6 +2,7 @@ from sqlalchemy import and_
 from sqlalchemy.exc import IntegrityError
 
 from skeletor.core import log
+from skeletor.db import context as context_mod
 from skeletor.db import sql
 from skeletor.db.decorators import query
 from skeletor.db.decorators import mutator
@@ -25,11 +26,29 @@ class ScopedLogger(object):
 
 
 class Table(object):
-    """Run simple queries against specific tables"""
+    """Run simple queries against specific tables
 
-    def __init__(self, table, logger=None, verbose=False):
+    An optional :class:`skeletor.db.cache.RowCache` serves lookups by id
+    and by unique columns from memory.  The cache is invalidated by this
+    class's :func:`update`, :func:`delete` and :func:`insert` methods;
+    writes made through other means are only seen once entries expire.
+    Rows are only cached once the context's transaction has committed,
+    and invalidated rows are invalidated again after the commit.
+
+    Read methods accept `columns`, a sequence of column names, to select
+    only those columns.  Lookups that name their columns bypass the cache.
+
+    When `slots` is True, single-row lookups and :func:`find_by_ids`
+    return compact :class:`skeletor.db.rows.Row` objects instead of dicts.
+
+    """
+
+    def __init__(self, table, logger=None, verbose=False, cache=None,
+                 slots=False):
         self.table = table
         self.verbose = verbose
+        self.cache = cache
+        self.slots = slots
         if verbose:
             logger = ScopedLogger(self, logger=logger)
         self.logger = logger
@@ -37,6 +56,84 @@ class Table(object):
     def get(self, context=None):
         return context.tables[self.table]
 
+    def cache_key(self, column, value):
+        """Return the row cache key for a column value"""
+        return (self.table, column, value)
+
+    def cache_column(self, table, filters):
+        """Return the unique column name for a cacheable lookup, or None"""
+        if self.cache is None or len(filters) != 1:
+            return None
+        name, value = list(filters.items())[0]
+        if value is None:
+            return None
+        column = table.c.get(name)
+        if column is None or not (column.primary_key or column.unique):
+            return None
+        return name
+
+    def cache_get(self, column, value):
+        """Return a cached row by id or by a unique column value"""
+        if column == 'id':
+            row = self.cache.get(self.cache_key('id', value))
+        else:
+            # Unique columns map to ids.  The row is checked because the
+            # mapping is stale when the column's value has been updated.
+            row_id = self.cache.get(self.cache_key(column, value))
+            if row_id is None:
+                row = None
+            else:
+                row = self.cache.get(self.cache_key('id', row_id))
+                if row is not None and row[column] != value:
+                    row = None
+        self.cache.record(row is not None)
+        if row is not None:
+            row = dict(row)
+        return row
+
+    def cache_set(self, table, row, context=None):
+        """Cache a row once the context's transaction has committed"""
+        if self.cache is None or row is None:
+            return
+        context_mod.on_commit(context, lambda: self.cache_store(table, row))
+
+    def cache_store(self, table, row):
+        """Store a row in the cache by id and by its unique columns"""
+        row_id = row['id']
+        self.cache.set(self.cache_key('id', row_id), dict(row))
+        for column in table.c:
+            if column.unique and not column.primary_key:
+                value = row[column.name]
+                if value is not None:
+                    key = self.cache_key(column.name, value)
+                    self.cache.set(key, row_id)
+
+    def cached_row(self, table, row):
+        """Return a cached row as a compact row when `slots` is True"""
+        if self.slots:
+            row_class = sql.slotted_row_class(table)
+            if row_class is not None:
+                row = row_class.from_mapping(row)
+        return row
+
+    def cache_delete(self, row_id, context=None):
+        """Invalidate a cached row now and after the transaction commits
+
+        Concurrent readers may cache the old row until the new one is
+        committed, so the row is invalidated a second time.
+
+        """
+        if self.cache is not None and row_id is not None:
+            key = self.cache_key('id', row_id)
+            self.cache.delete(key)
+            context_mod.on_commit(context, lambda: self.cache.delete(key))
+
+    def cache_clear(self, context=None):
+        """Forget all cached rows now and after the transaction commits"""
+        if self.cache is not None:
+            self.cache.clear()
+            context_mod.on_commit(context, self.cache.clear)
+
     @mutator
     def new(self, context=None, **kwargs):
         try:
@@ -52,44 +149,282 @@ class Table(object):
                                   % (self.table, repr(kwargs), repr(e)))
             return None
         table = self.get(context=context)
-        return sql.select_one(table, id=row_id)
+        row = sql.select_one(table, slots=self.slots, id=row_id)
+        self.cache_set(table, row, context=context)
+        return row
 
     @mutator
     def update(self, row_id, context=None, **kwargs):
         table = self.get(context=context)
+        self.cache_delete(row_id, context=context)
         return sql.update(table, row_id, **kwargs)
 
+    @mutator
+    def update_many(self, updates, batch_size=sql.DEFAULT_BATCH_SIZE,
+                    context=None):
+        """Update rows from `(id, values)` pairs in batches
+
+        Returns a :class:`sql.BulkResult`.
+
+        """
+        table = self.get(context=context)
+        updates = list(updates)
+        for row_id, values in updates:
+            self.cache_delete(row_id, context=context)
+        result = sql.update_many(table, updates, batch_size=batch_size)
+        if self.verbose:
+            for index, batch, e in result.errors:
+                self.logger.error('update_many: batch %d failed in %s -> %s'
+                                  % (index, self.table, repr(e)))
+        return result
+
+    @query
+    def fetchall(self, columns=None, context=None):
+        table = self.get(context=context)
+        return sql.fetchall(table, columns=columns)
+
+    @query
+    def filter_by(self, operator=and_, columns=None, context=None,
+                  **filters):
+        table = self.get(context=context)
+        column = None
+        if columns is None:
+            column = self.cache_column(table, filters)
+        if column is None:
+            return sql.select_one(table, operator=operator, columns=columns,
+                                  slots=self.slots, **filters)
+        row = self.cache_get(column, filters[column])
+        if row is None:
+            row = sql.select_one(table, operator=operator, slots=self.slots,
+                                 **filters)
+            self.cache_set(table, row, context=context)
+        else:
+            row = self.cached_row(table, row)
+        return row
+
     @query
-    def fetchall(self, context=None):
+    def ifilter_by(self, operator=and_, columns=None, context=None,
+                   **filters):
         table = self.get(context=context)
-        return sql.fetchall(table)
+        return sql.select_one(table, where=sql.iwhere, operator=operator,
+                              columns=columns, slots=self.slots, **filters)
 
     @query
-    def filter_by(self, operator=and_, context=None, **filters):
+    def select_all(self, columns=None, context=None, **filters):
         table = self.get(context=context)
-        return sql.select_one(table, operator=operator, **filters)
+        return sql.select_all(table, columns=columns, **filters)
 
     @query
-    def ifilter_by(self, operator=and_, context=None, **filters):
+    def count(self, operator=and_, context=None, **filters):
+        """Return the number of rows matching column=value criteria"""
         table = self.get(context=context)
-        return sql.select_one(table, where=sql.iwhere,
-                              operator=operator, **filters)
+        return sql.count_rows(table, operator=operator, **filters)
 
     @query
-    def select_all(self, context=None, **filters):
+    def exists(self, operator=and_, context=None, **filters):
+        """Return True when a row matches column=value criteria"""
         table = self.get(context=context)
-        return sql.select_all(table, **filters)
+        return sql.row_exists(table, operator=operator, **filters)
 
     @query
-    def find_by_id(self, row_id, context=None):
-        return self.filter_by(id=row_id, context=context)
+    def aggregate(self, group_by=None, count=False, sum=None, min=None,
+                  max=None, avg=None, operator=and_, context=None,
+                  **filters):
+        """Compute aggregates server-side; see :func:`sql.aggregate`"""
+        table = self.get(context=context)
+        return sql.aggregate(table, group_by=group_by, operator=operator,
+                             count=count, sum=sum, min=min, max=max, avg=avg,
+                             **filters)
+
+    @query
+    def iter_all(self, fetch_size=sql.DEFAULT_FETCH_SIZE, dicts=False,
+                 columns=None, context=None, **filters):
+        """Yield rows lazily, optionally filtered by column=value criteria
+
+        The context remains open until the iterator is exhausted or closed.
+
+        """
+        table = self.get(context=context)
+        if filters:
+            rows = sql.iter_select(table, fetch_size=fetch_size, dicts=dicts,
+                                   columns=columns, **filters)
+        else:
+            rows = sql.iter_all(table, fetch_size=fetch_size, dicts=dicts,
+                                columns=columns)
+        for row in rows:
+            yield row
+
+    @query
+    def to_columns(self, columns=None, fetch_size=sql.DEFAULT_FETCH_SIZE,
+                   operator=and_, context=None, **filters):
+        """Read rows into one array per column; see :func:`sql.fetch_columns`
+
+        Returns an OrderedDict mapping column names to arrays.
+
+        """
+        table = self.get(context=context)
+        expr = sql.select_columns(table, columns=columns)
+        if filters:
+            expr = expr.where(sql.where(table, operator=operator, **filters))
+        return sql.fetch_columns(expr, fetch_size=fetch_size)
+
+    @query
+    def paginate(self, order_by=None, after=None,
+                 limit=sql.DEFAULT_PAGE_SIZE, descending=False,
+                 columns=None, context=None, **filters):
+        """Return one page of rows and the cursor for the next page
+
+        Returns a `(rows, cursor)` tuple.  The cursor is None on the
+        last page and is otherwise passed as `after` to fetch the next page.
+
+        """
+        table = self.get(context=context)
+        rows = sql.paginate(table, order_by=order_by, after=after,
+                            limit=limit, descending=descending,
+                            columns=columns, **filters)
+        if len(rows) < limit:
+            cursor = None
+        else:
+            columns = sql.order_columns(table, order_by=order_by)
+            cursor = sql.page_key(rows[-1], columns)
+        return (rows, cursor)
+
+    @query
+    def pages(self, order_by=None, after=None, limit=sql.DEFAULT_PAGE_SIZE,
+              descending=False, columns=None, context=None, **filters):
+        """Yield successive pages of rows using keyset pagination"""
+        while True:
+            rows, after = self.paginate(order_by=order_by, after=after,
+                                        limit=limit, descending=descending,
+                                        columns=columns, context=context,
+                                        **filters)
+            if rows:
+                yield rows
+            if after is None:
+                break
+
+    @query
+    def find_by_id(self, row_id, columns=None, context=None):
+        return self.filter_by(id=row_id, columns=columns, context=context)
+
+    @query
+    def find_by_ids(self, ids, chunk_size=sql.DEFAULT_BATCH_SIZE,
+                    columns=None, context=None):
+        """Return a dict mapping each id to its row, or None when missing
+
+        Cached rows are served from the row cache and only the misses are
+        queried, using chunked `IN (...)` queries.
+
+        """
+        table = self.get(context=context)
+        result = dict((row_id, None) for row_id in ids)
+        if self.cache is None or columns is not None:
+            missing = list(result)
+        else:
+            missing = []
+            for row_id in result:
+                row = self.cache_get('id', row_id)
+                if row is None:
+                    missing.append(row_id)
+                else:
+                    result[row_id] = self.cached_row(table, row)
+        rows = sql.select_ids(table, missing, chunk_size=chunk_size,
+                              columns=columns, slots=self.slots)
+        for row_id, row in rows.items():
+            if columns is None:
+                self.cache_set(table, row, context=context)
+            result[row_id] = row
+        return result
 
     @mutator
     def insert(self, values, context=None):
         table = self.get(context=context)
-        return table.insert(values).execute().lastrowid
+        row_id = table.insert(values).execute().lastrowid
+        self.cache_delete(row_id, context=context)
+        return row_id
+
+    @mutator
+    def insert_many(self, rows, batch_size=sql.DEFAULT_BATCH_SIZE,
+                    returning=False, context=None):
+        """Insert rows in batches; returns a :class:`sql.BulkResult`"""
+        table = self.get(context=context)
+        result = sql.insert_many(table, rows, batch_size=batch_size,
+                                 returning=returning)
+        for row_id in result.ids or ():
+            self.cache_delete(row_id, context=context)
+        if self.verbose:
+            for index, batch, e in result.errors:
+                self.logger.error('insert_many: batch %d failed in %s -> %s'
+                                  % (index, self.table, repr(e)))
+        return result
+
+    @mutator
+    def new_many(self, rows, batch_size=sql.DEFAULT_BATCH_SIZE, context=None):
+        """Create rows in bulk
+
+        Returns a :class:`sql.BulkResult`.  When the dialect supports
+        RETURNING then `result.rows` contains the newly created rows,
+        otherwise it is None.
+
+        """
+        result = self.insert_many(rows, batch_size=batch_size,
+                                  returning=True, context=context)
+        if result.ids is not None:
+            table = self.get(context=context)
+            rows = sql.select_ids(table, result.ids, chunk_size=batch_size)
+            result.rows = [rows.get(row_id) for row_id in result.ids]
+        return result
+
+    @mutator
+    def upsert(self, conflict_columns, values, context=None):
+        """Insert a row or update the row that conflicts with it
+
+        `conflict_columns` names the unique columns used to detect
+        conflicts.  Returns the resulting row.
+
+        """
+        table = self.get(context=context)
+        row = sql.upsert(table, conflict_columns, values,
+                         dialect=context.dialect())
+        self.cache_set(table, row, context=context)
+        return row
+
+    @mutator
+    def upsert_many(self, conflict_columns, rows,
+                    batch_size=sql.DEFAULT_BATCH_SIZE, context=None):
+        """Insert or update rows in batches
+
+        Returns a :class:`sql.BulkResult`.
+
+        """
+        table = self.get(context=context)
+        # The updated rows are unknown so forget everything
+        self.cache_clear(context=context)
+        result = sql.upsert_many(table, conflict_columns, rows,
+                                 batch_size=batch_size,
+                                 dialect=context.dialect())
+        if self.verbose:
+            for index, batch, e in result.errors:
+                self.logger.error('upsert_many: batch %d failed in %s -> %s'
+                                  % (index, self.table, repr(e)))
+        return result
 
     @mutator
     def delete(self, operator=and_, context=None, **filters):
         table = self.get(context=context)
+        if list(filters) == ['id']:
+            self.cache_delete(filters['id'], context=context)
+        else:
+            # The deleted rows are unknown so forget everything
+            self.cache_clear(context=context)
         return sql.delete(table, operator=operator, **filters)
+
+    @mutator
+    def delete_ids(self, ids, chunk_size=sql.DEFAULT_BATCH_SIZE,
+                   context=None):
+        """Delete rows by id; returns the number of deleted rows"""
+        table = self.get(context=context)
+        ids = list(ids)
+        for row_id in ids:
+            self.cache_delete(row_id, context=context)
+        return sql.delete_ids(table, ids, chunk_size=chunk_size)
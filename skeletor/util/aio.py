@@ -0,0 +1,144 @@
+"""Decorators to provide contexts to coroutine functions
+
+These are the asyncio counterparts of :mod:`skeletor.util.decorators`.
+Contexts are acquired, committed and released using coroutines so that
+asyncio applications do not need to push calls into threads.
+
+Callers can override the decorator-provided resource by passing in
+`context=...` as a keyword argument at the call site.  Synchronous
+:class:`skeletor.util.decorators.Context` instances are also accepted.
+
+"""
+
+import functools
+import inspect
+
+from skeletor.util import decorators
+from skeletor.util import metrics
+
+
+async def resolve(value):
+    """Await a value if it is awaitable, otherwise return it as-is"""
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+class AsyncContext(object):
+    """Base class for custom asynchronous contexts"""
+
+    async def acquire(self):
+        """Called once iff the context is constructed by the context manager"""
+        pass
+
+    async def __aenter__(self):
+        """Called when entering a context"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Called when exiting a context"""
+        if exc_type is None:
+            await self.success()
+        else:
+            await self.error()
+        return False
+
+    async def success(self):
+        """Called when exiting a context successfully"""
+        pass
+
+    async def error(self):
+        """Called when a exiting a context via an exception"""
+        pass
+
+    async def release(self):
+        """Called at the end of a context iff constructed by a manager"""
+        pass
+
+    def nested(self, *args, **kwargs):
+        """Return the context manager used when the context is passed through
+
+        See :func:`skeletor.util.decorators.Context.nested`.  Asynchronous
+        and synchronous context managers are both accepted.
+
+        """
+        return self
+
+
+class AsyncContextManager(decorators.DefaultContextManager):
+
+    async def __aenter__(self):
+        if self.default_factory is None:
+            self.default_factory = decorators.DefaultFactory
+        if self.context is None and not self.borrow():
+            self.managed = True
+            with metrics.timer('acquire_seconds'):
+                context = self.default_factory.create(*self.args,
+                                                      **self.kwargs)
+                await context.acquire()
+            self.context = context
+            self.push()
+            return await context.__aenter__()
+        self.managed = False
+        # Supplied and borrowed contexts are entered the same way as in
+        # the synchronous decorators, e.g. nested mutators use a SAVEPOINT.
+        self.passthrough = decorators.passthrough(self.context, *self.args,
+                                                  **self.kwargs)
+        if hasattr(type(self.passthrough), '__aenter__'):
+            return await self.passthrough.__aenter__()
+        return self.passthrough.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.managed:
+            self.pop()
+            await self.context.__aexit__(exc_type, exc_value, traceback)
+            await resolve(self.context.release())
+            self.context = None
+        elif hasattr(type(self.passthrough), '__aexit__'):
+            await self.passthrough.__aexit__(exc_type, exc_value, traceback)
+        else:
+            self.passthrough.__exit__(exc_type, exc_value, traceback)
+        self.passthrough = None
+        if self.borrowed:
+            self.borrowed = False
+            self.context = None
+        # Re-raise exceptions
+        return False
+
+
+class acquire_async_context(decorators.acquire_context):
+    """A decorator to provide coroutine functions with a live context"""
+
+    def __init__(self,
+                 default_factory,
+                 default_contextmgr=None,
+                 decorator=None,
+                 *args, **kwargs):
+        decorators.acquire_context.__init__(
+            self, default_factory,
+            default_contextmgr=default_contextmgr or AsyncContextManager,
+            decorator=decorator, *args, **kwargs)
+
+    def __call__(self, f):
+        """Wrap a coroutine function and return a decorated coroutine"""
+
+        name = metrics.qualname(f)
+
+        @functools.wraps(f)
+        async def wrapper(*args, **kwargs):
+            """Wraps f() to provide a context as a keyword argument"""
+            if not metrics.enabled():
+                return await call(*args, **kwargs)
+            with metrics.track(name) as event:
+                result = await call(*args, **kwargs)
+                rows = metrics.rows(result)
+                if rows is not None:
+                    event.add('rows', rows)
+                return result
+
+        async def call(*args, **kwargs):
+            async with self.contextmgr(kwargs) as context:
+                kwargs['context'] = context
+                return await f(*args, **kwargs)
+
+        return self.decorator(wrapper)
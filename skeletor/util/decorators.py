@@ -9,23 +9,94 @@ by passing in `context=...` as a keyword argument at
 the call site, which is needed when the resource has
 been pre-allocated and needs to be reused between calls.
 
+Contexts created by the decorators are also tracked on an ambient,
+per-thread and per-asyncio-task :class:`ContextStack`.  Nested decorated
+calls can reuse the enclosing context without passing `context=...`
+when their factory's :func:`accepts` method allows it.
+
 """
 
 import functools
+import inspect
+
+from skeletor.core.compat import ContextVar
+from skeletor.util import metrics
+from skeletor.util.retry import RetryPolicy
+
+
+class ContextStack(object):
+    """The stack of contexts entered by decorated functions
+
+    The stack is tracked using :mod:`contextvars` so that it is local to
+    each thread and asyncio task.  Thread-local storage is used when
+    :mod:`contextvars` is unavailable.
+
+    """
+
+    def __init__(self):
+        self._var = ContextVar('skeletor_contexts', default=())
+
+    def entries(self):
+        """Return the `(factory, context)` entries, innermost last"""
+        return self._var.get()
+
+    def push(self, factory, context):
+        """Push a context and return a token for :func:`pop`"""
+        return self._var.set(self._var.get() + ((factory, context),))
+
+    def pop(self, token):
+        """Restore the stack to its state before the matching push"""
+        self._var.reset(token)
+
+    def current(self, factory):
+        """Return the innermost context created by `factory`, or None"""
+        for entry_factory, context in reversed(self.entries()):
+            if entry_factory is factory:
+                return context
+        return None
+
+
+# The ambient contexts entered by decorated functions
+contexts = ContextStack()
+
+# Keyword arguments that supply retry policies, lowest precedence first
+RETRY_KEYS = ('retry', 'retry_policy')
+
+
+def pop_retry_policy(kwargs, default=None):
+    """Remove and return a :class:`RetryPolicy` from `kwargs`
+
+    Only :class:`RetryPolicy` values are consumed.  Other values are left
+    in place so that decorated functions can have their own arguments with
+    the same names.  `default` is returned when no policy was supplied.
+
+    """
+    policy = default
+    for key in RETRY_KEYS:
+        if isinstance(kwargs.get(key), RetryPolicy):
+            policy = kwargs.pop(key)
+    return policy
 
 
 class DefaultFactory(object):
     """Creates contexts"""
 
+    @staticmethod
+    def accepts(context, *args, **kwargs):
+        """Can an enclosing context be reused for these context arguments?
+
+        Factories opt in to ambient context reuse by returning True.
+
+        """
+        return False
+
     @staticmethod
     def filter_kwargs(kwargs):
         """Filter context arguments out from the function's kwargs"""
         filtered = {}
         for key in ('context', 'default_factory'):
-            try:
+            if key in kwargs:
                 filtered[key] = kwargs.pop(key)
-            except KeyError:
-                pass
         return filtered
 
     @staticmethod
@@ -33,12 +104,31 @@ class DefaultFactory(object):
         raise NotImplementedError('create() is not implemented')
 
 
+def passthrough(context, *args, **kwargs):
+    """Return the context manager used when a context is passed through
+
+    Contexts that are supplied by the caller, or borrowed from an enclosing
+    call, are not managed by the decorator.  Contexts can customize how they
+    are entered in that case by implementing :func:`Context.nested`, which
+    receives the decorator's context arguments.
+
+    """
+    if getattr(type(context), 'nested', None) is None:
+        return context
+    return context.nested(*args, **kwargs)
+
+
 class DefaultContextManager(object):
 
     def __init__(self, context=None, default_factory=None, *args, **kwargs):
         self.context = context
         self.default_factory = default_factory
         self.managed = False
+        # Whether to reuse and publish contexts on the ambient stack
+        self.ambient = True
+        self.borrowed = False
+        self.token = None
+        self.passthrough = None
         # Context arguments
         self.args = args
         self.kwargs = kwargs
@@ -46,25 +136,62 @@ class DefaultContextManager(object):
     def __enter__(self):
         if self.default_factory is None:
             self.default_factory = DefaultFactory
-        if self.context is None:
-            managed = True
-            context = self.default_factory.create(*self.args, **self.kwargs)
-            context.acquire()
+        if self.context is None and not self.borrow():
+            self.managed = True
+            with metrics.timer('acquire_seconds'):
+                context = self.default_factory.create(*self.args,
+                                                      **self.kwargs)
+                context.acquire()
             self.context = context
-        else:
-            managed = False
-            context = self.context
-        self.managed = managed
-        return context.__enter__()
+            self.push()
+            return context.__enter__()
+        self.managed = False
+        self.passthrough = passthrough(self.context, *self.args, **self.kwargs)
+        return self.passthrough.__enter__()
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.context.__exit__(exc_type, exc_value, traceback)
         if self.managed:
+            self.pop()
+            self.context.__exit__(exc_type, exc_value, traceback)
             self.context.release()
             self.context = None
+        else:
+            self.passthrough.__exit__(exc_type, exc_value, traceback)
+            self.passthrough = None
+        if self.borrowed:
+            self.borrowed = False
+            self.context = None
         # Re-raise exceptions
         return False
 
+    def borrow(self):
+        """Reuse the enclosing ambient context when the factory accepts it
+
+        Borrowed contexts are passed through like caller-supplied contexts.
+        They are committed or rolled back by the call that created them.
+
+        """
+        if not self.ambient:
+            return False
+        factory = self.default_factory
+        context = contexts.current(factory)
+        if context is None or not factory.accepts(context, *self.args,
+                                                  **self.kwargs):
+            return False
+        self.context = context
+        self.borrowed = True
+        return True
+
+    def push(self):
+        """Publish the managed context for nested calls"""
+        if self.ambient:
+            self.token = contexts.push(self.default_factory, self.context)
+
+    def pop(self):
+        if self.token is not None:
+            contexts.pop(self.token)
+            self.token = None
+
 
 def passthrough_decorator(f):
     """Return a function as-is, unchanged
@@ -90,6 +217,13 @@ class acquire_context(object):
     The blind `args` and `kwargs` are passed to the
     `default_factory` when contexts are constructed.
 
+    A `retry` keyword argument, either here, in `bind()` or at the call
+    site, provides a :class:`skeletor.util.retry.RetryPolicy` that re-runs
+    the function in a fresh context when it fails with a retryable error.
+    `retry_policy=...` overrides it at the call site.  Values that are not
+    a RetryPolicy are passed on to the function untouched.  Retries only
+    apply when the decorator creates the context.
+
     """
 
     def __init__(self,
@@ -105,6 +239,8 @@ class acquire_context(object):
         self.default_contextmgr = default_contextmgr or DefaultContextManager
         # Wraps our function with a user-supplied decorator
         self.decorator = decorator or passthrough_decorator
+        # Retry policy for contexts created by the decorator
+        self.retry = pop_retry_policy(kwargs)
         # Factory arguments
         self.args = args
         self.kwargs = kwargs
@@ -116,20 +252,123 @@ class acquire_context(object):
         construction and a wrapped function is returned.
 
         """
+        if inspect.isgeneratorfunction(f):
+            return self.decorator(self.generator_wrapper(f))
+
+        filter_kwargs = self.default_factory.filter_kwargs
+        contextmgr = self.contextmgr
+        default_retry = self.retry
+        # Custom context managers must see caller-supplied contexts too
+        fast_path = self.default_contextmgr is DefaultContextManager
+        enabled = metrics.enabled
+        name = metrics.qualname(f)
+
         @functools.wraps(f)
         def wrapper(*args, **kwargs):
             """Wraps f() to provide a context as a keyword argument"""
-            factory_kwargs = self.default_factory.filter_kwargs(kwargs)
-            factory_kwargs['default_factory'] = self.default_factory
+            if not enabled():
+                return call(*args, **kwargs)
+            with metrics.track(name) as event:
+                result = call(*args, **kwargs)
+                rows = metrics.rows(result)
+                if rows is not None:
+                    event.add('rows', rows)
+                return result
+
+        def call(*args, **kwargs):
+            retry = pop_retry_policy(kwargs, default=default_retry)
+            context = kwargs.get('context')
+            if context is not None and fast_path:
+                # Fast path: a caller-supplied context is entered directly
+                # without constructing a context manager.
+                factory_kwargs = filter_kwargs(kwargs)
+                if len(factory_kwargs) > 1:
+                    del factory_kwargs['context']
+                    ctx_kwargs = self.kwargs.copy()
+                    ctx_kwargs.update(factory_kwargs)
+                else:
+                    ctx_kwargs = self.kwargs
+                with passthrough(context, *self.args, **ctx_kwargs) as ctx:
+                    kwargs['context'] = ctx
+                    return f(*args, **kwargs)
+
+            if retry is None:
+                with contextmgr(kwargs) as context:
+                    kwargs['context'] = context
+                    return f(*args, **kwargs)
+
+            return self.retry_call(retry, f, args, kwargs)
 
-            ctx_kwargs = self.kwargs.copy()
-            ctx_kwargs.update(factory_kwargs)
+        return self.decorator(wrapper)
 
-            with self.default_contextmgr(*self.args, **ctx_kwargs) as context:
-                kwargs['context'] = context
-                return f(*args, **kwargs)
+    def retry_call(self, retry, f, args, kwargs):
+        """Call f() in a fresh context until it succeeds or `retry` gives up
 
-        return self.decorator(wrapper)
+        Borrowed contexts are never retried because the failed transaction
+        belongs to the enclosing call.
+
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            retry.attempted()
+            call_kwargs = kwargs.copy()
+            mgr = self.contextmgr(call_kwargs)
+            try:
+                with mgr as context:
+                    call_kwargs['context'] = context
+                    return f(*args, **call_kwargs)
+            except Exception as e:
+                if not mgr.managed or not retry.should_retry(e, attempt):
+                    raise
+            retry.sleep(retry.delay(attempt))
+
+    def generator_wrapper(self, f):
+        """Wrap a generator function
+
+        The context is held open until the generator is exhausted or
+        closed rather than being released as soon as it is created.
+
+        """
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            """Wraps f() to provide a context as a keyword argument"""
+            contextmgr = self.contextmgr(kwargs)
+            # The generator's context must not leak into the consumer's
+            # code, which runs between iterations.
+            contextmgr.ambient = False
+            if not metrics.enabled():
+                with contextmgr as context:
+                    kwargs['context'] = context
+                    for item in f(*args, **kwargs):
+                        yield item
+                return
+            # Timings include the consumer's time between iterations
+            with metrics.track(name, publish=False) as event:
+                with contextmgr as context:
+                    kwargs['context'] = context
+                    for item in f(*args, **kwargs):
+                        event.add('rows', 1)
+                        yield item
+
+        name = metrics.qualname(f)
+        return wrapper
+
+    def contextmgr(self, kwargs):
+        """Return a context manager for a call's keyword arguments
+
+        Factory arguments are consumed from `kwargs`.
+
+        """
+        # Retry policies are handled by the synchronous function wrapper
+        pop_retry_policy(kwargs)
+        factory_kwargs = self.default_factory.filter_kwargs(kwargs)
+        factory_kwargs['default_factory'] = self.default_factory
+
+        ctx_kwargs = self.kwargs.copy()
+        ctx_kwargs.update(factory_kwargs)
+
+        return self.default_contextmgr(*self.args, **ctx_kwargs)
 
 
 class bindfunc(object):
@@ -205,6 +444,15 @@ class Context(object):
         """Called at the end of a context iff constructed by a manager"""
         pass
 
+    def nested(self, *args, **kwargs):
+        """Return the context manager used when the context is passed through
+
+        The decorator's context arguments are provided.  The default is to
+        enter and exit the context itself.
+
+        """
+        return self
+
 
 class bind(object):
 
@@ -0,0 +1,274 @@
+"""Timing histograms for decorated functions
+
+When enabled, every call to a function decorated with
+:class:`skeletor.util.decorators.acquire_context` records an
+:class:`Event` with its timings and counts.  Events are tagged with the
+function's qualified name and collected into histograms by a
+:class:`Registry`, which can be dumped as JSON or in the Prometheus text
+exposition format.
+
+The following metrics are recorded:
+
+* `acquire_seconds` -- time spent creating and acquiring a context.
+* `call_seconds` -- total time spent in the decorated call.
+* `commit_seconds`, `rollback_seconds` -- time spent ending transactions.
+* `rows` -- the number of rows in list results.
+* `statements` -- statements executed, including nested calls.
+
+Metrics are disabled by default; see :func:`enable`.
+
+"""
+import bisect
+import threading
+import time
+
+from skeletor.core import json
+from skeletor.core.compat import ContextVar
+
+
+# Upper bounds, in seconds, of the timing histogram buckets
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the row and statement count histogram buckets
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_state = {'enabled': False}
+_events = ContextVar('skeletor_metrics_events', default=())
+
+
+class Histogram(object):
+    """Count observations into buckets with fixed upper bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        # The last slot counts values above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return (upper bound, count) pairs; the last bound is '+Inf'"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            'buckets': self.cumulative(),
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class Event(object):
+    """Timings and counts recorded for one decorated call"""
+
+    def __init__(self, name):
+        self.name = name
+        self.values = {}
+        self.error = False
+
+    def add(self, metric, value):
+        self.values[metric] = self.values.get(metric, 0) + value
+
+    def to_dict(self):
+        result = dict(self.values)
+        result['function'] = self.name
+        result['error'] = self.error
+        return result
+
+
+class Registry(object):
+    """Collect events into per-function histograms
+
+    `listeners` are called with each :class:`Event` as it is recorded.
+
+    """
+
+    def __init__(self, time_buckets=TIME_BUCKETS,
+                 count_buckets=COUNT_BUCKETS):
+        self.time_buckets = time_buckets
+        self.count_buckets = count_buckets
+        self.histograms = {}
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def histogram(self, metric, function):
+        """Return the histogram for a metric and function"""
+        key = (metric, function)
+        try:
+            return self.histograms[key]
+        except KeyError:
+            if metric.endswith('_seconds'):
+                buckets = self.time_buckets
+            else:
+                buckets = self.count_buckets
+            return self.histograms.setdefault(key, Histogram(buckets))
+
+    def observe(self, metric, function, value):
+        with self._lock:
+            self.histogram(metric, function).observe(value)
+
+    def record(self, event):
+        """Observe each of an event's values and notify listeners"""
+        with self._lock:
+            for metric, value in event.values.items():
+                self.histogram(metric, event.name).observe(value)
+        for listener in self.listeners:
+            listener(event)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Return {metric: {function: histogram dict}}"""
+        result = {}
+        with self._lock:
+            for (metric, function), histogram in self.histograms.items():
+                result.setdefault(metric, {})[function] = histogram.to_dict()
+        return result
+
+    def to_json(self, **kwargs):
+        """Serialize the histograms using :func:`skeletor.core.json.dumps`"""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def prometheus(self, prefix='skeletor'):
+        """Return the histograms in the Prometheus text exposition format"""
+        lines = []
+        snapshot = self.snapshot()
+        for metric in sorted(snapshot):
+            name = prefix + '_' + metric
+            lines.append('# TYPE %s histogram' % name)
+            functions = snapshot[metric]
+            for function in sorted(functions):
+                histogram = functions[function]
+                label = 'function="%s"' % escape_label(function)
+                for bound, count in histogram['buckets']:
+                    lines.append('%s_bucket{%s,le="%s"} %d'
+                                 % (name, label, bound, count))
+                lines.append('%s_sum{%s} %r' % (name, label, histogram['sum']))
+                lines.append('%s_count{%s} %d'
+                             % (name, label, histogram['count']))
+        if lines:
+            lines.append('')
+        return '\n'.join(lines)
+
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+    return (value.replace('\\', '\\\\')
+            .replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+registry = Registry()
+
+
+def enable(new_registry=None):
+    """Start recording events, optionally into a different registry"""
+    global registry
+    if new_registry is not None:
+        registry = new_registry
+    _state['enabled'] = True
+    return registry
+
+
+def disable():
+    _state['enabled'] = False
+
+
+def enabled():
+    return _state['enabled']
+
+
+def qualname(f):
+    """Return the qualified name used to tag a function's events"""
+    name = getattr(f, '__qualname__', f.__name__)
+    return f.__module__ + '.' + name
+
+
+def events():
+    """Return the events of the calls in progress, innermost last"""
+    return _events.get()
+
+
+def add(metric, value):
+    """Add a value to the innermost call's event"""
+    active = _events.get()
+    if active:
+        active[-1].add(metric, value)
+
+
+def count(metric, value=1):
+    """Add a count to every call in progress, including enclosing calls"""
+    for event in _events.get():
+        event.add(metric, value)
+
+
+def rows(result):
+    """Return the number of rows in a result, or None when unknown"""
+    if type(result) is list:
+        return len(result)
+    return None
+
+
+class track(object):
+    """Record an event for a decorated call
+
+    The event is published so that nested code can add to it using
+    :func:`add` and :func:`count`.  Generators pass `publish=False`
+    because the consumer's code runs between iterations.
+
+    """
+
+    def __init__(self, name, publish=True):
+        self.name = name
+        self.publish = publish
+        self.event = None
+        self.token = None
+        self.start = None
+
+    def __enter__(self):
+        self.event = Event(self.name)
+        if self.publish:
+            self.token = _events.set(_events.get() + (self.event,))
+        self.start = time.time()
+        return self.event
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = self.event
+        event.add('call_seconds', time.time() - self.start)
+        event.error = exc_type is not None
+        if self.token is not None:
+            _events.reset(self.token)
+            self.token = None
+        registry.record(event)
+        return False
+
+
+class timer(object):
+    """Add the elapsed time of a block to the innermost call's event"""
+
+    def __init__(self, metric):
+        self.metric = metric
+        self.start = None
+
+    def __enter__(self):
+        if _state['enabled']:
+            self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start is not None:
+            add(self.metric, time.time() - self.start)
+        return False
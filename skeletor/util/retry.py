@@ -0,0 +1,83 @@
+"""Retry policies for transient failures
+
+A :class:`RetryPolicy` re-runs a callable when it raises an exception that
+its `retryable` classifier considers transient, sleeping between attempts
+using exponential backoff with optional full jitter.
+
+"""
+import random
+import threading
+import time
+
+
+class RetryPolicy(object):
+    """Retry a callable with exponential backoff and jitter
+
+    :param max_attempts: total number of attempts, including the first.
+    :param backoff: delay in seconds before the first retry.
+    :param max_delay: upper bound for the delay between attempts.
+    :param jitter: randomize delays between zero and the backoff delay.
+    :param retryable: called with an exception; returns True to retry.
+
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.05, max_delay=2.0,
+                 jitter=True, retryable=None, sleep=time.sleep,
+                 random=random.random):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retryable = retryable or (lambda e: False)
+        self.sleep = sleep
+        self.random = random
+        # Counters for monitoring
+        self.attempts = 0
+        self.retries = 0
+        self.give_ups = 0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt):
+        """Return the delay before retrying after the given attempt"""
+        delay = min(self.max_delay, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay *= self.random()
+        return delay
+
+    def should_retry(self, exc, attempt):
+        """Record a failed attempt and decide whether to try again"""
+        if not self.retryable(exc):
+            return False
+        with self._lock:
+            if attempt >= self.max_attempts:
+                self.give_ups += 1
+                return False
+            self.retries += 1
+        return True
+
+    def attempted(self):
+        """Record an attempt"""
+        with self._lock:
+            self.attempts += 1
+
+    def call(self, fn, *args, **kwargs):
+        """Call `fn` until it succeeds or the policy gives up"""
+        attempt = 0
+        while True:
+            attempt += 1
+            self.attempted()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+            self.sleep(self.delay(attempt))
+
+    def stats(self):
+        """Return a dict of retry counters"""
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'give_ups': self.give_ups,
+            }
@@ -0,0 +1,70 @@
+import unittest
+
+from sqlalchemy import or_
+
+from tests import testlib
+
+from skeletor.db import advisor
+from skeletor.db import sql
+
+
+class IndexAdvisorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = testlib.new_schema()
+        self.users = self.schema.users
+        self.documents = self.schema.documents
+        self.advisor = advisor.enable()
+
+    def tearDown(self):
+        advisor.disable()
+
+    def lookups(self):
+        self.schema.create()
+        sql.select_one(self.users, name='a')
+        sql.select_one(self.users, name='b')
+        sql.select_one(self.users, email='a')
+        sql.select_all(self.users, where=sql.iwhere, email='A')
+        sql.select_all(self.users, operator=or_, id=1, name='a')
+        sql.select_one(self.documents, title='a')
+
+    def test_report(self):
+        self.lookups()
+        report = self.advisor.report()
+        self.assertEqual(
+            [(e['table'], e['columns'], e['lower'], e['match_any'],
+              e['calls']) for e in report],
+            [('users', ('name',), False, False, 2),
+             ('documents', ('title',), False, False, 1),
+             ('users', ('email',), True, False, 1),
+             ('users', ('id', 'name'), False, True, 1)])
+        self.assertFalse(True in [e['indexed'] for e in report])
+
+        report = self.advisor.report(include_indexed=True)
+        self.assertEqual(len(report), 5)
+        indexed = [e for e in report if e['indexed']]
+        self.assertEqual(indexed[0]['columns'], ('email',))
+
+    def test_indexes_cover_lookups(self):
+        self.schema.add_index('users', 'name')
+        self.schema.add_index('users', 'email', lower=True)
+        self.schema.add_index('documents', 'title', 'id')
+        self.lookups()
+        self.assertEqual(self.advisor.report(), [])
+
+    def test_disabled(self):
+        advisor.disable()
+        self.assertEqual(advisor.current(), None)
+        self.lookups()
+        self.assertEqual(self.advisor.usage, {})
+
+    def test_iwhere_is_case_insensitive(self):
+        self.schema.create()
+        self.users.insert().execute(name='first', email='a@example.com')
+        user = sql.select_one(self.users, where=sql.iwhere,
+                              email='A@EXAMPLE.%')
+        self.assertEqual(user['name'], 'first')
+
+
+if __name__ == '__main__':
+    unittest.main()
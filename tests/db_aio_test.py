@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+
+from tests import testlib
+
+from skeletor.db import aio
+from skeletor.db import sql
+
+
+class AsyncSchema(object):
+    """Wrap a schema and record coroutine commit/rollback calls"""
+
+    def __init__(self):
+        self.schema = testlib.new_schema().create()
+        self.calls = []
+
+    async def begin_nested(self):
+        self.calls.append('begin_nested')
+
+    async def commit(self):
+        self.calls.append('commit')
+
+    async def rollback(self):
+        self.calls.append('rollback')
+
+    async def unbind(self):
+        self.calls.append('unbind')
+
+    def __getattr__(self, name):
+        return getattr(self.schema, name)
+
+
+schemas = []
+
+
+async def creator(commit=False):
+    schema = AsyncSchema()
+    schemas.append(schema)
+    return schema
+
+
+@aio.async_query.bind(creator=creator)
+async def select_one(context=None, **kwargs):
+    return sql.select_one(context.users, **kwargs)
+
+
+@aio.async_mutator.bind(creator=creator)
+async def create_user(fail=False, context=None, **kwargs):
+    context.users.insert(kwargs).execute()
+    await asyncio.sleep(0)
+    if fail:
+        raise ValueError('fail')
+    return sql.select_one(context.users, **kwargs)
+
+
+@aio.async_mutator.bind(creator=creator)
+async def create_users(emails, context=None):
+    for email in emails:
+        try:
+            await create_user(fail=email.startswith('bad'), email=email)
+        except ValueError:
+            pass
+    return [user['email'] for user in sql.fetchall(context.users)]
+
+
+class Users(object):
+
+    @aio.staticmethod_async_query.bind(creator=creator)
+    async def select_one(context=None, **kwargs):
+        return sql.select_one(context.users, **kwargs)
+
+    @aio.classmethod_async_query.bind(creator=creator)
+    async def classmethod_select_one(cls, context=None, **kwargs):
+        return await cls.select_one(context=context, **kwargs)
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class DBAsyncDecoratorsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        del schemas[:]
+
+    def test_query(self):
+        self.assertEqual(run(select_one(email='missing')), None)
+        self.assertEqual(schemas[0].calls, ['unbind'])
+
+    def test_mutator_commits(self):
+        user = run(create_user(name='a', email='a'))
+        self.assertEqual(user['email'], 'a')
+        self.assertEqual(schemas[0].calls, ['commit', 'unbind'])
+
+    def test_mutator_rolls_back(self):
+        with self.assertRaises(ValueError):
+            run(create_user(fail=True, email='a'))
+        self.assertEqual(schemas[0].calls, ['rollback', 'unbind'])
+
+    def test_context_passthrough(self):
+        context = testlib.create_database(self)
+        user = run(create_user(email='a', context=context))
+        self.assertEqual(user['email'], 'a')
+        user = run(Users.select_one(email='a', context=context))
+        self.assertEqual(user['email'], 'a')
+        self.assertEqual(schemas, [])
+
+    def test_nested_query_leaves_outer_transaction(self):
+        outer = run(creator(commit=True))
+        context = aio.AsyncDatabaseContext(context=outer, commit=True)
+        self.assertEqual(run(select_one(email='a', context=context)), None)
+        self.assertEqual(run(Users.select_one(email='a', context=context)),
+                         None)
+        self.assertEqual(outer.calls, [])
+
+    def test_nested_mutators_use_savepoints(self):
+        outer = run(creator(commit=True))
+        context = aio.AsyncDatabaseContext(context=outer, commit=True)
+        user = run(create_user(email='a', context=context))
+        self.assertEqual(user['email'], 'a')
+        self.assertEqual(outer.calls, ['begin_nested', 'commit'])
+
+        del outer.calls[:]
+        with self.assertRaises(ValueError):
+            run(create_user(fail=True, email='b', context=context))
+        # Only the savepoint was rolled back
+        self.assertEqual(outer.calls, ['begin_nested', 'rollback'])
+
+    def test_read_only_context_is_passed_through(self):
+        outer = run(creator())
+        context = aio.AsyncDatabaseContext(context=outer)
+        run(create_user(email='a', context=context))
+        self.assertEqual(outer.calls, [])
+
+    def test_borrowed_mutators_use_savepoints(self):
+        run(create_users(['a', 'bad', 'c']))
+        self.assertEqual(len(schemas), 1)
+        self.assertEqual(schemas[0].calls, [
+            'begin_nested', 'commit',
+            'begin_nested', 'rollback',
+            'begin_nested', 'commit',
+            'commit', 'unbind'])
+
+    def test_staticmethod_and_classmethod(self):
+        self.assertEqual(run(Users.select_one(email='a')), None)
+        self.assertEqual(run(Users.classmethod_select_one(email='a')), None)
+        self.assertEqual(len(schemas), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
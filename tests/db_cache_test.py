@@ -0,0 +1,58 @@
+import unittest
+
+from skeletor.db import cache
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = cache.LRUCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get_and_set(self):
+        self.assertEqual(self.cache.get('a'), None)
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.delete('a')
+        self.assertEqual(self.cache.get('a'), None)
+
+    def test_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.size(), 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('b'), None)
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9.0
+        self.assertEqual(self.cache.get('a'), 1)
+        self.clock.now = 10.0
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_stats(self):
+        self.cache.record(True)
+        self.cache.record(True)
+        self.cache.record(False)
+        self.cache.record(True)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.75)
+        self.assertEqual(stats['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
+import sqlite3
 import unittest
 
+from sqlalchemy.exc import OperationalError
+
 from tests import testlib
 
+from skeletor.db import context as context_mod
 from skeletor.db import decorators
+from skeletor.db import retry
 from skeletor.db import sql
 from skeletor.util import decorators as core_decorators
 
@@ -35,6 +40,79 @@ def fancy_bound_select_one(context=None, **kwargs):
     return sql.select_one(context.users, **kwargs)
 
 
+commits = []
+
+
+def recording_creator(commit=False):
+    commits.append(commit)
+    return creator(commit=commit)
+
+
+@decorators.mutator.bind(creator=recording_creator)
+def bound_mutator(context=None):
+    return True
+
+
+creators = []
+
+
+def counting_creator(commit=False):
+    ctx = creator(commit=commit)
+    creators.append(commit)
+    return ctx
+
+
+@decorators.query.bind(creator=counting_creator)
+def counting_select_one(context=None, **kwargs):
+    return (context, sql.select_one(context.users, **kwargs))
+
+
+@decorators.mutator.bind(creator=counting_creator)
+def counting_update(name, context=None):
+    sql.update(context.users, 1, name=name)
+    return (context, counting_select_one(name=name))
+
+
+@decorators.query.bind(creator=counting_creator)
+def counting_query_update(name, context=None):
+    return (context, counting_update(name))
+
+
+@decorators.mutator.bind(creator=creator)
+def insert_user(email, fail=False, context=None):
+    context.users.insert(dict(email=email)).execute()
+    if fail:
+        raise ValueError(email)
+
+
+@decorators.mutator.bind(creator=creator)
+def insert_users(emails, context=None):
+    for email in emails:
+        try:
+            insert_user(email, fail=email.startswith('bad'))
+        except ValueError:
+            pass
+    return [user['email'] for user in sql.fetchall(context.users)]
+
+
+retry_policy = retry.policy(sleep=lambda delay: None)
+attempts = []
+
+
+@decorators.mutator.bind(creator=creator, retry=retry_policy)
+def locked_update(failures, context=None):
+    attempts.append(context)
+    if len(attempts) <= failures:
+        error = sqlite3.OperationalError('database is locked')
+        raise OperationalError('UPDATE users', {}, error)
+    return sql.update(context.users, 1, name='updated').rowcount
+
+
+@decorators.query.bind(creator=creator)
+def count_retries(retry=3, context=None):
+    return retry
+
+
 class Query(object):
 
     @decorators.query.bind(creator=creator)
@@ -164,6 +242,105 @@ class DBDecoratorsTestCase(unittest.TestCase):
         user = Query.explicit_classmethod_select_one(name='test')
         self.assertEqual(user['email'], 'test@example.com')
 
+    def test_bound_mutator_commits(self):
+        del commits[:]
+        self.assertTrue(bound_mutator())
+        self.assertEqual(commits, [True])
+
+    def test_nested_calls_reuse_ambient_context(self):
+        del creators[:]
+        context, (inner_context, user) = counting_update('updated')
+        self.assertTrue(context is inner_context)
+        self.assertEqual(user['name'], 'updated')
+        self.assertEqual(creators, [True])
+
+    def test_mutators_do_not_reuse_query_contexts(self):
+        del creators[:]
+        context, (inner_context, _) = counting_query_update('updated')
+        self.assertFalse(context is inner_context)
+        self.assertEqual(creators, [False, True])
+
+    def test_nested_mutators_use_savepoints(self):
+        context = testlib.new_context(ctx=testlib.new_schema().create(),
+                                      commit=True)
+        context.begin()
+        insert_user('a', context=context)
+        with self.assertRaises(ValueError):
+            insert_user('bad', fail=True, context=context)
+        insert_user('c', context=context)
+        context.commit()
+
+        emails = [user['email'] for user in sql.fetchall(context.users)]
+        self.assertEqual(emails, ['a', 'c'])
+
+    def test_ambient_nested_mutators_use_savepoints(self):
+        emails = insert_users(['a', 'bad1', 'b', 'bad2'])
+        self.assertEqual(emails, ['test@example.com', 'a', 'b'])
+
+    def test_queries_do_not_commit_passed_contexts(self):
+        context = testlib.new_context(ctx=testlib.new_schema().create(),
+                                      commit=True)
+        context.begin()
+        insert_user('a', context=context)
+        select_one(email='a', context=context)
+        context.rollback()
+        self.assertEqual(sql.fetchall(context.users), [])
+
+    def test_query_errors_do_not_roll_back(self):
+        test_schema = testlib.new_schema().create()
+        test_schema.begin()
+        test_schema.users.insert(dict(email='a')).execute()
+        query_context = context_mod.DatabaseContext(context=test_schema)
+        query_context.error()
+        test_schema.commit()
+        users = sql.fetchall(test_schema.users)
+        self.assertEqual([user['email'] for user in users], ['a'])
+
+    def test_transient_errors_are_retried(self):
+        del attempts[:]
+        self.assertEqual(locked_update(1), 1)
+        # Each attempt acquired a fresh context
+        self.assertEqual(len(attempts), 2)
+        self.assertFalse(attempts[0] is attempts[1])
+        self.assertEqual(retry_policy.stats()['retries'], 1)
+
+        del attempts[:]
+        with self.assertRaises(OperationalError):
+            locked_update(3)
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(retry_policy.stats()['give_ups'], 1)
+
+    def test_transient_errors(self):
+        error = sqlite3.OperationalError('database is locked')
+        self.assertTrue(retry.transient(OperationalError('', {}, error)))
+        error = sqlite3.OperationalError('no such table: users')
+        self.assertFalse(retry.transient(OperationalError('', {}, error)))
+        self.assertFalse(retry.transient(ValueError()))
+
+    def test_transient_errors_use_the_dialect_classifier(self):
+        locked = OperationalError('', {}, sqlite3.OperationalError(
+            'database is locked'))
+        self.assertTrue(retry.transient(locked, dialect='sqlite'))
+        self.assertFalse(retry.transient(locked, dialect='postgresql'))
+        # MySQL error codes are not checked for sqlite errors
+        error = OperationalError('', {}, sqlite3.OperationalError(1205))
+        self.assertFalse(retry.transient(error))
+        self.assertTrue(retry.transient(error, dialect='mysql'))
+        self.assertFalse(retry.policy(dialect='postgresql').retryable(locked))
+
+    def test_retry_arguments_belong_to_the_function(self):
+        self.assertEqual(count_retries(), 3)
+        self.assertEqual(count_retries(retry=5), 5)
+        self.assertEqual(count_retries(retry=None), None)
+
+    def test_call_site_retry_policy(self):
+        del attempts[:]
+        policy = retry.policy(max_attempts=1, sleep=lambda delay: None)
+        with self.assertRaises(OperationalError):
+            locked_update(1, retry_policy=policy)
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(policy.stats()['attempts'], 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,135 @@
+import datetime
+import decimal
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import Numeric
+from sqlalchemy import Text
+
+from tests import testlib
+
+from skeletor.core import json
+from skeletor.db import exporter
+from skeletor.db import sql
+
+
+class EventSchema(testlib.Schema):
+
+    def __init__(self):
+        testlib.Schema.__init__(self)
+
+        self.add_table(
+            'events',
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('name', Text),
+            Column('price', Numeric(10, 2)),
+            Column('created', DateTime))
+
+
+def read_lines(path):
+    if path.endswith('.gz'):
+        fp = gzip.open(path, 'rb')
+    else:
+        fp = open(path, 'rb')
+    with fp:
+        return [json.loads(line.decode('utf-8')) for line in fp]
+
+
+class ExporterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Threads need a file database; each thread would get its own
+        # in-memory database.
+        url = 'sqlite:///' + os.path.join(self.tmpdir, 'test.db')
+        self.schema = EventSchema().bind_url(url, shared=False).create()
+        self.outdir = os.path.join(self.tmpdir, 'out')
+        os.mkdir(self.outdir)
+        created = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        sql.insert_many(self.schema.events, [
+            {'name': 'event%d' % idx, 'price': decimal.Decimal('1.50'),
+             'created': created}
+            for idx in range(10)])
+        sql.insert_many(self.schema.documents, [
+            {'title': 'doc', 'body': 'body'}])
+
+    def tearDown(self):
+        self.schema.unbind()
+        shutil.rmtree(self.tmpdir)
+
+    def test_export_table(self):
+        result = exporter.export_table(self.schema.events, self.outdir,
+                                       fetch_size=3)
+        self.assertEqual(result.count, 10)
+        path = os.path.join(self.outdir, 'events.jsonl')
+        self.assertEqual(result.paths, [path])
+        self.assertEqual(result.size, os.path.getsize(path))
+        rows = read_lines(path)
+        self.assertEqual(rows[0], {'id': 1, 'name': 'event0',
+                                   'price': '1.50',
+                                   'created': '2020-01-02T03:04:05'})
+        self.assertEqual([row['id'] for row in rows], list(range(1, 11)))
+
+    def test_rotation(self):
+        line_size = len(exporter.dumps({'id': 1, 'name': 'event0',
+                                        'price': '1.50',
+                                        'created': '2020-01-02T03:04:05'}))
+        result = exporter.export_table(self.schema.events, self.outdir,
+                                       max_bytes=line_size * 4,
+                                       compress=True)
+        self.assertEqual([os.path.basename(path) for path in result.paths],
+                         ['events.00000.jsonl.gz', 'events.00001.jsonl.gz',
+                          'events.00002.jsonl.gz'])
+        counts = [len(read_lines(path)) for path in result.paths]
+        self.assertEqual(counts, [4, 4, 2])
+
+    def test_empty_table(self):
+        result = exporter.export_table(self.schema.users, self.outdir)
+        self.assertEqual(result.count, 0)
+        self.assertEqual(read_lines(result.paths[0]), [])
+
+    def test_deferred_columns(self):
+        result = exporter.export_table(self.schema.documents, self.outdir)
+        self.assertEqual(read_lines(result.paths[0]),
+                         [{'id': 1, 'title': 'doc'}])
+        result = exporter.export_table(self.schema.documents, self.outdir,
+                                       columns=sql.ALL_COLUMNS)
+        self.assertEqual(read_lines(result.paths[0]),
+                         [{'id': 1, 'title': 'doc', 'body': 'body'}])
+
+    def test_export_tables(self):
+        tables = [self.schema.events, self.schema.documents,
+                  self.schema.users]
+        results = exporter.export_tables(tables, self.outdir, workers=2)
+        self.assertEqual(sorted(results), ['documents', 'events', 'users'])
+        self.assertEqual(results['events'].count, 10)
+        self.assertEqual(results['documents'].count, 1)
+        self.assertEqual(sorted(os.listdir(self.outdir)),
+                         ['documents.jsonl', 'events.jsonl', 'users.jsonl'])
+
+    def test_export_tables_error(self):
+        tables = [self.schema.events, self.schema.users]
+        missing = os.path.join(self.tmpdir, 'missing')
+        self.assertRaises(IOError, exporter.export_tables, tables, missing)
+
+
+class JSONTestCase(unittest.TestCase):
+
+    def test_handler(self):
+        value = {
+            'date': datetime.date(2020, 1, 2),
+            'time': datetime.time(3, 4, 5),
+            'price': decimal.Decimal('0.10'),
+        }
+        self.assertEqual(json.loads(json.dumps(value)), {
+            'date': '2020-01-02', 'time': '03:04:05', 'price': '0.10'})
+
+
+if __name__ == '__main__':
+    unittest.main()
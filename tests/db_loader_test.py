@@ -0,0 +1,164 @@
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import Boolean
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Float
+from sqlalchemy import Integer
+from sqlalchemy import Text
+
+from tests import testlib
+
+from skeletor.db import loader
+from skeletor.db import schema
+from skeletor.db import sql
+
+
+class EventSchema(schema.Schema):
+
+    def __init__(self):
+        schema.Schema.__init__(self)
+
+        self.add_table(
+            'events',
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('name', Text),
+            Column('count', Integer),
+            Column('score', Float),
+            Column('active', Boolean),
+            Column('created', DateTime))
+
+
+CSV = u'''name,count,score,active,created
+a,1,1.5,true,2020-01-02 03:04:05
+b,,2,no,2020-01-02
+c,3,,1,
+'''
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class MessageLogger(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def info(self, msg):
+        self.messages.append(msg)
+
+
+class LoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.schema = EventSchema().bind_url('sqlite:///:memory:').create()
+        self.events = self.schema.events
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_csv(self):
+        records = loader.read_csv(io.StringIO(CSV))
+        result = loader.load(self.events, records, batch_size=2)
+        self.assertEqual(result.count, 3)
+        self.assertEqual(result.batches, 2)
+
+        rows = sql.rowdicts(sql.fetchall(self.events))
+        self.assertEqual(rows[0], {
+            'id': 1, 'name': 'a', 'count': 1, 'score': 1.5, 'active': True,
+            'created': datetime.datetime(2020, 1, 2, 3, 4, 5)})
+        self.assertEqual(rows[1]['count'], None)
+        self.assertEqual(rows[1]['active'], False)
+        self.assertEqual(rows[1]['created'], datetime.datetime(2020, 1, 2))
+        self.assertEqual(rows[2]['score'], None)
+        self.assertEqual(rows[2]['created'], None)
+
+    def test_jsonl(self):
+        data = u'{"name": "a", "count": 1}\n\n{"name": "b", "score": "2.5"}\n'
+        records = loader.read_jsonl(io.StringIO(data))
+        result = loader.load(self.events, records)
+        self.assertEqual(result.count, 2)
+        rows = sql.rowdicts(sql.fetchall(self.events))
+        self.assertEqual([(r['name'], r['count'], r['score']) for r in rows],
+                         [('a', 1, None), ('b', None, 2.5)])
+
+    def test_unknown_columns(self):
+        records = [{'name': 'a', 'missing': 1}]
+        self.assertRaises(ValueError, loader.load, self.events, records)
+
+    def test_checkpoint_resumes(self):
+        path = os.path.join(self.tmpdir, 'events.checkpoint')
+        checkpoint = loader.Checkpoint(path)
+        records = [{'name': str(i), 'count': str(i)} for i in range(5)]
+        records[4]['count'] = 'invalid'
+        self.assertRaises(ValueError, loader.load, self.events, records,
+                          batch_size=2, checkpoint=checkpoint,
+                          source='input')
+        self.assertEqual(checkpoint.load(source='input', table='events'), 4)
+        # Checkpoints for other inputs are not resumed
+        self.assertEqual(checkpoint.load(source='other', table='events'), 0)
+
+        records[4]['count'] = '4'
+        result = loader.load(self.events, records, batch_size=2,
+                             checkpoint=checkpoint, source='input')
+        self.assertEqual(result.skipped, 4)
+        self.assertEqual(result.count, 1)
+        rows = sql.fetchall(self.events)
+        self.assertEqual([row['count'] for row in rows], [0, 1, 2, 3, 4])
+
+        checkpoint.clear()
+        self.assertEqual(checkpoint.load(source='input', table='events'), 0)
+
+    def test_progress(self):
+        logger = MessageLogger()
+        progress = loader.Progress(logger=logger, interval=2.0,
+                                   clock=Clock())
+        records = [{'name': str(i)} for i in range(6)]
+        loader.load(self.events, records, batch_size=2, progress=progress)
+        self.assertEqual(logger.messages, [
+            'loaded 4 records (2 records/s)',
+            'loaded 6 records (2 records/s)',
+        ])
+
+    def test_detect_format(self):
+        self.assertEqual(loader.detect_format('a/b.CSV'), 'csv')
+        self.assertEqual(loader.detect_format('b.jsonl'), 'jsonl')
+        self.assertRaises(ValueError, loader.detect_format, 'b.txt')
+
+    def test_main(self):
+        url = 'sqlite:///' + os.path.join(self.tmpdir, 'test.sqlite')
+        path = os.path.join(self.tmpdir, 'users.csv')
+        with io.open(path, 'w') as fp:
+            fp.write(u'name,email\na,a@example.com\nb,b@example.com\n')
+        argv = ['--url', url, '--schema', 'tests.testlib.Schema',
+                '--table', 'users', '--create', '--checkpoint',
+                os.path.join(self.tmpdir, 'users.checkpoint'), path]
+        self.assertEqual(loader.main(argv), 0)
+        # The checkpoint prevents the records from being loaded twice
+        self.assertEqual(loader.main(argv), 0)
+
+        test_schema = testlib.Schema().bind_url(url, shared=False)
+        try:
+            rows = sql.fetchall(test_schema.users)
+            self.assertEqual([row['email'] for row in rows],
+                             ['a@example.com', 'b@example.com'])
+        finally:
+            test_schema.unbind()
+            schema.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from tests import testlib
+
+from skeletor.core import json
+from skeletor.db import pool
+from skeletor.db import schema
+from skeletor.util import config
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+
+class OptionsTestCase(unittest.TestCase):
+
+    def test_options(self):
+        values = {
+            '__doc__': 'comment',
+            'size': 10,
+            'max_overflow': 5,
+            'pool_recycle': 3600,
+            'pre_ping': True,
+            'timeout': None,
+        }
+        self.assertEqual(pool.options(values), {
+            'pool_size': 10,
+            'max_overflow': 5,
+            'pool_recycle': 3600,
+            'pool_pre_ping': True,
+        })
+        self.assertEqual(pool.options(None), {})
+
+    def test_unknown_options(self):
+        self.assertRaises(ValueError, pool.options, {'sizes': 10})
+
+    def test_config(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'app.json')
+            json.write({'database_pool': {'size': 3, 'recycle': 60}}, path)
+            values = config.JSONConfig(path)
+            self.assertEqual(pool.config(values),
+                             {'pool_size': 3, 'pool_recycle': 60})
+            self.assertEqual(pool.config(values, key='missing'), {})
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class PoolStatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.url = 'sqlite:///' + os.path.join(self.tmpdir, 'test.sqlite')
+
+    def tearDown(self):
+        schema.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_queue_pool(self):
+        engine = create_engine(self.url, poolclass=QueuePool, pool_size=2,
+                               max_overflow=0, pool_timeout=0.01)
+        stats = pool.install(engine, clock=Clock())
+        first = engine.connect()
+        second = engine.connect()
+        self.assertRaises(exc.TimeoutError, engine.connect)
+        second.close()
+
+        result = pool.stats(engine)
+        self.assertEqual(result['pool'], 'QueuePool')
+        self.assertEqual(result['checked_out'], 1)
+        self.assertEqual(result['checkouts'], 2)
+        self.assertEqual(result['connects'], 2)
+        self.assertEqual(result['idle'], 1)
+        self.assertEqual(result['size'], 2)
+        self.assertEqual(result['timeouts'], 1)
+        self.assertEqual(result['wait_seconds']['count'], 3)
+        self.assertEqual(result['max_wait_seconds'], 0.5)
+
+        first.invalidate()
+        first.close()
+        self.assertEqual(stats.invalidations, 1)
+        self.assertEqual(stats.checked_out, 0)
+
+        # Pools recreated by dispose() are still timed
+        engine.dispose()
+        engine.connect().close()
+        self.assertEqual(pool.stats(engine)['wait_seconds']['count'], 4)
+
+    def test_schema_pool_options(self):
+        test_schema = testlib.Schema().bind_url(
+            self.url, pool={'pre_ping': True, 'recycle': 60})
+        self.assertTrue(test_schema.engine.pool._pre_ping)
+        self.assertEqual(test_schema.engine.pool._recycle, 60)
+        # Engines with other pool options are not shared
+        other = testlib.Schema().bind_url(self.url)
+        self.assertFalse(test_schema.engine is other.engine)
+
+        test_schema.create()
+        result = test_schema.pool_stats()
+        self.assertTrue(result['checkouts'] >= 1)
+        self.assertEqual(result['invalidations'], 0)
+        self.assertEqual(result['idle'], None)
+
+        test_schema.unbind()
+        self.assertEqual(test_schema.pool_stats(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests import testlib
+
+from skeletor.db import decorators
+from skeletor.db import replicas
+from skeletor.db import schema
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ReplicaRouterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.primary = self.url('primary')
+        self.replicas = [self.url('replica1'), self.url('replica2')]
+        self.clock = Clock()
+
+    def tearDown(self):
+        schema.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    def url(self, name):
+        return 'sqlite:///' + os.path.join(self.tmpdir, name + '.sqlite')
+
+    def router(self, **kwargs):
+        return replicas.ReplicaRouter(testlib.Schema, self.primary,
+                                      replicas=self.replicas,
+                                      clock=self.clock, **kwargs)
+
+    def test_round_robin(self):
+        router = self.router()
+        self.assertEqual(router.route(commit=True), self.primary)
+        self.assertEqual([router.route() for i in range(3)],
+                         self.replicas + self.replicas[:1])
+        self.assertEqual(router.stats(),
+                         {'primary': 1, 'replica': 3, 'pinned': 0})
+
+    def test_least_connections(self):
+        router = self.router(balance=replicas.LEAST_CONNECTIONS)
+        checkedout = {self.replicas[0]: 2, self.replicas[1]: 1}
+        router.connections = checkedout.get
+        self.assertEqual(router.route(), self.replicas[1])
+        checkedout[self.replicas[1]] = 3
+        self.assertEqual(router.route(), self.replicas[0])
+        # Pools without checkout counts are treated as idle
+        self.assertEqual(replicas.ReplicaRouter.connections(
+            router, self.replicas[0]), 0)
+
+    def test_least_connections_with_pool_options(self):
+        router = self.router(balance=replicas.LEAST_CONNECTIONS,
+                             pool={'pre_ping': True})
+        busy = router()
+        self.assertEqual(str(busy.engine.url), self.replicas[0])
+        conn = busy.engine.connect()
+        try:
+            self.assertEqual(router.connections(self.replicas[0]), 1)
+            self.assertEqual(router.route(), self.replicas[1])
+        finally:
+            conn.close()
+            busy.unbind()
+
+    def test_reads_are_pinned_after_mutators(self):
+        router = self.router(pin_window=2.0)
+        router(commit=True).commit()
+        self.clock.now = 1.9
+        self.assertEqual(router.route(), self.primary)
+        self.clock.now = 2.0
+        self.assertEqual(router.route(), self.replicas[0])
+        self.assertEqual(router.stats()['pinned'], 1)
+
+    def test_decorators_route_contexts(self):
+        router = self.router()
+        for url in [self.primary] + self.replicas:
+            testlib.Schema().bind_url(url).create()
+
+        @decorators.query.bind(creator=router)
+        def query_url(context=None):
+            return str(context.engine.url)
+
+        @decorators.mutator.bind(creator=router)
+        def mutator_url(context=None):
+            return str(context.engine.url)
+
+        self.assertEqual(mutator_url(), self.primary)
+        self.assertEqual(query_url(), self.replicas[0])
+        self.assertEqual(query_url(), self.replicas[1])
+
+    def test_pin_window_starts_at_commit(self):
+        router = self.router(pin_window=2.0)
+        testlib.Schema().bind_url(self.primary).create()
+
+        @decorators.mutator.bind(creator=router)
+        def slow_mutator(context=None):
+            self.assertEqual(router.route(), self.replicas[0])
+            self.clock.now = 5.0
+
+        slow_mutator()
+        self.clock.now = 6.9
+        self.assertEqual(router.route(), self.primary)
+        self.clock.now = 7.0
+        self.assertEqual(router.route(), self.replicas[1])
+
+    def test_failed_mutators_do_not_pin(self):
+        router = self.router(pin_window=2.0)
+        testlib.Schema().bind_url(self.primary).create()
+
+        @decorators.mutator.bind(creator=router)
+        def failing_mutator(context=None):
+            raise ValueError('failed')
+
+        self.assertRaises(ValueError, failing_mutator)
+        self.assertEqual(router.route(), self.replicas[0])
+
+    def test_unknown_balance(self):
+        with self.assertRaises(ValueError):
+            self.router(balance='random')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from tests import testlib
+
+from skeletor.db import cache
+from skeletor.db import rows
+from skeletor.db import sql
+from skeletor.db import table
+
+
+class RowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = testlib.new_schema().create()
+        self.users = self.schema.users
+        self.users.insert().execute(name='a', email='a@example.com')
+
+    def test_row_class_is_generated_by_add_table(self):
+        row_class = rows.row_class(self.users)
+        self.assertTrue(row_class is rows.row_class(self.users))
+        self.assertEqual(row_class.__name__, 'UsersRow')
+        self.assertEqual(row_class._fields, ('id', 'name', 'email'))
+        self.assertEqual(row_class.__slots__, ('id', 'name', 'email'))
+        # Deferred columns are left out of the default row class
+        documents = rows.row_class(self.schema.documents)
+        self.assertEqual(documents._fields, ('id', 'title'))
+
+    def test_mapping_access(self):
+        row = sql.select_one(self.users, slots=True, name='a')
+        self.assertTrue(isinstance(row, rows.Row))
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual(row['name'], 'a')
+        self.assertEqual(row.email, 'a@example.com')
+        self.assertEqual(row.get('missing', 42), 42)
+        self.assertRaises(KeyError, lambda: row['missing'])
+        self.assertTrue('id' in row)
+        self.assertEqual(list(row), ['id', 'name', 'email'])
+        self.assertEqual(len(row), 3)
+        expect = {'id': 1, 'name': 'a', 'email': 'a@example.com'}
+        self.assertEqual(row, expect)
+        self.assertEqual(dict(row), expect)
+        self.assertEqual(row.to_dict(), expect)
+        self.assertFalse(row != expect)
+
+        row['name'] = 'b'
+        self.assertEqual(row.name, 'b')
+        self.assertEqual(repr(row),
+                         "UsersRow(id=1, name='b', email='a@example.com')")
+
+    def test_projections(self):
+        row = sql.select_one(self.users, slots=True, columns=['email'],
+                             name='a')
+        self.assertEqual(row.keys(), ['email'])
+        row = sql.select_one(self.schema.documents, slots=True,
+                             columns=sql.ALL_COLUMNS, title='missing')
+        self.assertEqual(row, None)
+
+    def test_rowdicts(self):
+        self.users.insert().execute(name='b', email='b@example.com')
+        row_class = rows.row_class(self.users)
+        result = sql.rowdicts(sql.fetchall(self.users), row_class=row_class)
+        self.assertEqual([row.name for row in result], ['a', 'b'])
+        self.assertEqual(sql.rowdict(None, row_class=row_class), None)
+
+    def test_invalid_fields_use_dicts(self):
+        self.assertEqual(rows.make_row_class('Bad', ['items']), None)
+        self.assertEqual(rows.make_row_class('Bad', ['first name']), None)
+        self.assertEqual(rows.make_row_class('Bad', ['class']), None)
+
+
+class TableRowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = testlib.create_database(self)
+        self.cache = cache.LRUCache()
+        self.table = table.Table('users', cache=self.cache, slots=True)
+
+    def test_filter_by(self):
+        context = self.context
+        user = self.table.new(name='a', email='a', context=context)
+        self.assertTrue(isinstance(user, rows.Row))
+
+        # Cached rows are returned as rows too
+        cached = self.table.find_by_id(user['id'], context=context)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertTrue(isinstance(cached, rows.Row))
+        self.assertEqual(cached, user)
+
+        found = self.table.filter_by(name='a', context=context)
+        self.assertTrue(isinstance(found, rows.Row))
+        found = self.table.ifilter_by(email='A', context=context)
+        self.assertEqual(found.name, 'a')
+
+    def test_find_by_ids(self):
+        context = self.context
+        first = self.table.new(name='a', email='a', context=context)
+        second = self.table.new(name='b', email='b', context=context)
+        self.cache.clear()
+        # Cache the first row; the second is queried
+        self.table.find_by_id(first['id'], context=context)
+
+        result = self.table.find_by_ids([first['id'], second['id'], 42],
+                                        context=context)
+        self.assertEqual(result[42], None)
+        for row, expect in ((result[first['id']], first),
+                            (result[second['id']], second)):
+            self.assertTrue(isinstance(row, rows.Row))
+            self.assertEqual(row, expect)
+
+        result = self.table.find_by_ids([second['id']], columns=['email'],
+                                        context=context)
+        row = result[second['id']]
+        self.assertTrue(isinstance(row, rows.Row))
+        self.assertEqual(row, {'id': second['id'], 'email': 'b'})
+
+
+@unittest.skipIf(tracemalloc is None, 'requires tracemalloc')
+class RowMemoryTestCase(unittest.TestCase):
+    """Benchmark the memory used per row by dicts and compact rows"""
+
+    def measure(self, convert, count=10000):
+        values = [(i, 'name%d' % i, 'email%d' % i) for i in range(count)]
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            result = [convert(value) for value in values]
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(result), count)
+        return float(after - before) / count
+
+    def test_memory_per_row(self):
+        fields = ('id', 'name', 'email')
+        row_class = rows.make_row_class('UsersRow', fields)
+        dict_size = self.measure(lambda value: dict(zip(fields, value)))
+        row_size = self.measure(lambda value: row_class(*value))
+        self.assertTrue(row_size < dict_size,
+                        'memory per row: dict %.0f bytes, row %.0f bytes'
+                        % (dict_size, row_size))
+
+
+if __name__ == '__main__':
+    unittest.main()
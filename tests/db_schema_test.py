@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests import testlib
+
+from skeletor.db import decorators
+from skeletor.db import schema
+from skeletor.db import sql
+
+
+urls = []
+
+
+def creator_a(commit=False):
+    test_schema = testlib.Schema().bind_url(urls[-1])
+    return testlib.new_context(ctx=test_schema, commit=commit)
+
+
+def creator_b(commit=False):
+    test_schema = testlib.Schema().bind_url(urls[-1])
+    return testlib.new_context(ctx=test_schema, commit=commit)
+
+
+@decorators.mutator.bind(creator=creator_b)
+def insert_user(name, fail=False, context=None):
+    context.users.insert(dict(name=name)).execute()
+    if fail:
+        raise ValueError(name)
+
+
+@decorators.mutator.bind(creator=creator_a)
+def outer_fails(context=None):
+    insert_user('inner')
+    raise ValueError('outer')
+
+
+@decorators.mutator.bind(creator=creator_a)
+def inner_fails(context=None):
+    try:
+        insert_user('inner', fail=True)
+    except ValueError:
+        pass
+    context.users.insert(dict(name='outer')).execute()
+
+
+class EngineRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'test.sqlite')
+        self.url = 'sqlite:///' + path
+        self.registry = schema.EngineRegistry()
+
+    def tearDown(self):
+        self.registry.shutdown()
+        schema.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_engines_are_reused(self):
+        first = self.registry.get(self.url)
+        second = self.registry.get(self.url)
+        self.assertTrue(first is second)
+
+        stats = self.registry.stats()
+        self.assertEqual(stats['engines'], 1)
+        self.assertEqual(stats['creates'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_engine_options_are_part_of_the_key(self):
+        first = self.registry.get(self.url, strategy='plain')
+        second = self.registry.get(self.url)
+        self.assertFalse(first is second)
+        self.assertEqual(self.registry.stats()['creates'], 2)
+
+    def test_shutdown_disposes_engines(self):
+        self.registry.get(self.url)
+        self.registry.get(self.url, strategy='plain')
+        self.assertEqual(self.registry.shutdown(), 2)
+
+        stats = self.registry.stats()
+        self.assertEqual(stats['engines'], 0)
+        self.assertEqual(stats['disposes'], 2)
+
+    def test_bind_url_shares_engines(self):
+        first = testlib.Schema().bind_url(self.url)
+        second = testlib.Schema().bind_url(self.url)
+        self.assertTrue(first.shared)
+        self.assertTrue(first.engine is second.engine)
+
+        engine = first.engine
+        first.unbind()
+        self.assertTrue(schema.registry.owns(engine))
+        self.assertEqual(second.create().dialect(), 'sqlite')
+
+    def test_memory_databases_are_not_shared(self):
+        first = testlib.new_schema()
+        second = testlib.new_schema()
+        self.assertFalse(first.shared)
+        self.assertFalse(first.engine is second.engine)
+
+
+class NestedContextsTestCase(unittest.TestCase):
+    """Contexts from different creators on one URL are independent"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        urls.append('sqlite:///' + os.path.join(self.tmpdir, 'test.sqlite'))
+        self.schema = testlib.Schema().bind_url(urls[-1]).create()
+
+    def tearDown(self):
+        self.schema.unbind()
+        schema.shutdown()
+        urls.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def names(self):
+        return [row['name'] for row in sql.fetchall(self.schema.users)]
+
+    def test_inner_commit_survives_outer_rollback(self):
+        self.assertRaises(ValueError, outer_fails)
+        self.assertEqual(self.names(), ['inner'])
+
+    def test_inner_rollback_keeps_outer_transaction(self):
+        inner_fails()
+        self.assertEqual(self.names(), ['outer'])
+
+    def test_engine_is_shared_outside_transactions(self):
+        first = creator_a()
+        second = creator_b()
+        self.assertTrue(first.engine is second.engine)
+
+
+class IndexTestCase(unittest.TestCase):
+
+    def test_add_index(self):
+        test_schema = testlib.new_schema()
+        index = test_schema.add_index('users', 'name')
+        self.assertEqual(index.name, 'ix_users_name')
+        index = test_schema.add_index('users', 'name', 'email', lower=True)
+        self.assertEqual(index.name, 'ix_users_lower_name_email')
+        index = test_schema.add_index('documents', 'title', unique=True,
+                                      name='documents_title')
+        self.assertTrue(index.unique)
+
+        test_schema.create()
+        rows = test_schema.engine.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+        self.assertEqual([row[0] for row in rows],
+                         ['documents_title', 'ix_users_lower_name_email',
+                          'ix_users_name'])
+        self.assertTrue('lower(users.name)' in rows[1][1] or
+                        'lower(name)' in rows[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
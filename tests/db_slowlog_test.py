@@ -0,0 +1,110 @@
+import unittest
+
+from tests import testlib
+
+from skeletor.db import decorators
+from skeletor.db import slowlog
+from skeletor.db import sql
+from skeletor.util import metrics
+
+
+class MessageLogger(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def warning(self, msg, *args):
+        self.messages.append(msg % args)
+
+
+def creator(commit=False):
+    test_schema = testlib.new_schema()
+    test_schema.create()
+    return testlib.new_context(ctx=test_schema, commit=commit)
+
+
+@decorators.query.bind(creator=creator)
+def find_user(email, context=None):
+    return sql.select_one(context.users, email=email)
+
+
+class SlowQueryLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = MessageLogger()
+
+    def tearDown(self):
+        slowlog.disable()
+        metrics.disable()
+
+    def test_disabled(self):
+        self.assertEqual(slowlog.current(), None)
+        find_user('user@example.com')
+        self.assertEqual(self.logger.messages, [])
+
+    def test_log_slow_statements(self):
+        slow_log = slowlog.enable(threshold=0.0, logger=self.logger)
+        find_user('user@example.com')
+
+        messages = [m for m in self.logger.messages if 'SELECT' in m]
+        self.assertEqual(len(messages), 1)
+        message = messages[0]
+        self.assertTrue(message.startswith('slow query: '))
+        self.assertTrue(__name__ + '.find_user' in message)
+        # Bound parameters are redacted
+        self.assertFalse('user@example.com' in message)
+        self.assertTrue(slow_log.stats()['logged'] >= 1)
+
+    def test_caller_from_metrics(self):
+        metrics.enable(metrics.Registry())
+        slowlog.enable(threshold=0.0, logger=self.logger)
+        find_user('user@example.com')
+        self.assertTrue(self.logger.messages)
+        for message in self.logger.messages:
+            self.assertTrue(' in %s.find_user: ' % __name__ in message)
+
+    def test_threshold(self):
+        slow_log = slowlog.SlowQueryLog(threshold=1.0, logger=self.logger)
+        self.assertFalse(slow_log.observe('SELECT 1', (), 0.5))
+        self.assertTrue(slow_log.observe('SELECT 1', (), 1.5))
+        self.assertEqual(slow_log.stats(),
+                         {'slow': 1, 'logged': 1, 'dropped': 0})
+
+    def test_sample_rate(self):
+        values = iter([0.5, 0.05])
+        slow_log = slowlog.SlowQueryLog(threshold=0.0, sample_rate=0.1,
+                                        random=lambda: next(values),
+                                        logger=self.logger)
+        self.assertFalse(slow_log.observe('SELECT 1', (), 1.0))
+        self.assertTrue(slow_log.observe('SELECT 1', (), 1.0))
+        self.assertEqual(slow_log.stats(),
+                         {'slow': 2, 'logged': 1, 'dropped': 1})
+
+    def test_max_per_interval(self):
+        now = [100.0]
+        slow_log = slowlog.SlowQueryLog(threshold=0.0, max_per_interval=2,
+                                        interval=10.0, clock=lambda: now[0],
+                                        logger=self.logger)
+        results = [slow_log.observe('SELECT 1', (), 1.0) for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        now[0] += 10.0
+        self.assertTrue(slow_log.observe('SELECT 1', (), 1.0))
+        self.assertEqual(len(self.logger.messages), 3)
+
+    def test_redact(self):
+        self.assertEqual(slowlog.redact({'email': 'secret'}),
+                         {'email': '?'})
+        self.assertEqual(slowlog.redact(('secret', 1)), ('?', '?'))
+        self.assertEqual(
+            slowlog.redact([('a',), ('b',)], executemany=True),
+            [('?',), '... 2 rows'])
+
+    def test_no_redact(self):
+        slow_log = slowlog.SlowQueryLog(threshold=0.0, redact=False,
+                                        logger=self.logger)
+        slow_log.observe('SELECT ?', ('visible',), 1.0)
+        self.assertTrue('visible' in self.logger.messages[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
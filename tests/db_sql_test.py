@@ -0,0 +1,343 @@
+import array
+import gc
+import unittest
+import weakref
+
+from sqlalchemy import Boolean
+from sqlalchemy import Column
+from sqlalchemy import Float
+from sqlalchemy import Integer
+from sqlalchemy import Text
+from sqlalchemy import exc
+from sqlalchemy import or_
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+
+from tests import testlib
+
+from skeletor.db import arrays
+from skeletor.db import sql
+
+
+class StatementCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = sql.StatementCache(maxsize=2)
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.cache.get('a', lambda: 1), 1)
+        self.assertEqual(self.cache.get('a', lambda: 2), 1)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.get('a', lambda: 'a')
+        self.cache.get('b', lambda: 'b')
+        self.cache.get('a', lambda: 'unused')
+        self.cache.get('c', lambda: 'c')
+        self.assertEqual(self.cache.stats()['size'], 2)
+        # 'b' was evicted, 'a' was recently used
+        self.assertEqual(self.cache.get('a', lambda: 'new'), 'a')
+        self.assertEqual(self.cache.get('b', lambda: 'new'), 'new')
+
+
+class CachedSelectTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = testlib.new_schema().create()
+        self.users = self.schema.users
+        self.users.insert().execute(name='first', email='a')
+        self.users.insert().execute(name='second', email='B')
+
+    def test_select_one_reuses_statements(self):
+        first = sql.cached_select(self.users, email='a')
+        second = sql.cached_select(self.users, email='b')
+        self.assertTrue(first is second)
+
+        user = sql.select_one(self.users, email='a')
+        self.assertEqual(user['name'], 'first')
+        user = sql.select_one(self.users, email='b')
+        self.assertEqual(user, None)
+
+    def test_statements_are_keyed_by_filters(self):
+        eq = sql.cached_select(self.users, email='a')
+        ilike = sql.cached_select(self.users, where=sql.iwhere, email='a')
+        both = sql.cached_select(self.users, email='a', name='first')
+        either = sql.cached_select(self.users, operator=or_,
+                                   email='a', name='first')
+        self.assertEqual(len(set([eq, ilike, both, either])), 4)
+
+        user = sql.select_one(self.users, where=sql.iwhere, email='b')
+        self.assertEqual(user['name'], 'second')
+
+        users = sql.select_all(self.users, operator=or_,
+                               email='a', name='second')
+        self.assertEqual(len(users), 2)
+
+    def test_cache_does_not_keep_engines_alive(self):
+        other = testlib.new_schema().create()
+        first = sql.cached_select(self.users, email='a')
+        second = sql.cached_select(other.users, email='a')
+        # Engines bound to the same URL share statements
+        self.assertTrue(first is second)
+
+        engine = weakref.ref(other.engine)
+        other.unbind()
+        del other
+        gc.collect()
+        self.assertEqual(engine(), None)
+
+    def test_none_values_are_not_cached(self):
+        self.assertEqual(sql.cached_select(self.users, name=None), None)
+        self.users.insert().execute(email='c')
+        user = sql.select_one(self.users, name=None)
+        self.assertEqual(user['email'], 'c')
+
+
+class ProjectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = testlib.new_schema().create()
+        self.users = self.schema.users
+        self.documents = self.schema.documents
+        self.users.insert().execute(name='first', email='a')
+        self.documents.insert().execute(title='doc', body='x' * 1000)
+
+    def test_columns(self):
+        rows = sql.fetchall(self.users, columns=['email'])
+        self.assertEqual([dict(row) for row in rows], [{'email': 'a'}])
+
+        user = sql.select_one(self.users, columns=('name',), email='a')
+        self.assertEqual(user, {'name': 'first'})
+
+        users = sql.select_all(self.users, columns=('id', 'name'),
+                               where=sql.iwhere, email='A')
+        self.assertEqual([dict(row) for row in users],
+                         [{'id': 1, 'name': 'first'}])
+
+    def test_projections_are_cached_separately(self):
+        narrow = sql.cached_select(self.users, columns=['name'], email='a')
+        wide = sql.cached_select(self.users, email='a')
+        self.assertFalse(narrow is wide)
+        self.assertTrue(
+            narrow is sql.cached_select(self.users, columns=('name',),
+                                        email='b'))
+
+    def test_deferred_columns(self):
+        self.assertEqual(sql.deferred_columns(self.documents),
+                         frozenset(['body']))
+        self.assertEqual(sql.deferred_columns(self.users), frozenset())
+
+        document = sql.select_one(self.documents, title='doc')
+        self.assertEqual(document, {'id': 1, 'title': 'doc'})
+        rows = sql.fetchall(self.documents)
+        self.assertEqual(list(rows[0].keys()), ['id', 'title'])
+
+        document = sql.select_one(self.documents, columns=sql.ALL_COLUMNS,
+                                  title='doc')
+        self.assertEqual(len(document['body']), 1000)
+        document = sql.select_one(self.documents, columns=['body'],
+                                  title='doc')
+        self.assertEqual(list(document), ['body'])
+
+    def test_unknown_deferred_columns(self):
+        schema = testlib.Schema()
+        self.assertRaises(KeyError, schema.add_table, 'broken',
+                          Column('id', Integer, primary_key=True),
+                          deferred=('missing',))
+
+    def test_required_columns(self):
+        rows = sql.paginate(self.users, columns=['name'])
+        self.assertEqual([dict(row) for row in rows],
+                         [{'name': 'first', 'id': 1}])
+        rows = sql.select_ids(self.documents, [1], columns=['title'])
+        self.assertEqual(rows, {1: {'title': 'doc', 'id': 1}})
+
+
+class FetchColumnsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = testlib.new_schema().create()
+        self.users = self.schema.users
+        self.users.insert().execute([
+            dict(name='a', email='1'), dict(name='b', email='2'),
+            dict(name='c', email='3')])
+
+    def test_arrays(self):
+        result = sql.fetch_columns(self.users, fetch_size=2, use_numpy=False)
+        self.assertEqual(list(result), ['id', 'name', 'email'])
+        self.assertEqual(result['id'], array.array('q', [1, 2, 3]))
+        self.assertEqual(result['name'], ['a', 'b', 'c'])
+
+    def test_columns(self):
+        expr = self.users.select().where(self.users.c.id > 1)
+        result = sql.fetch_columns(expr, columns=['email', 'id'],
+                                   use_numpy=False)
+        self.assertEqual(list(result), ['email', 'id'])
+        self.assertEqual(result['email'], ['2', '3'])
+
+        result = sql.fetch_columns(self.users, columns=['id'],
+                                   use_numpy=False)
+        self.assertEqual(list(result), ['id'])
+
+    def test_nulls(self):
+        self.users.insert().execute(id=None, name=None, email='4')
+        result = sql.fetch_columns(self.users, columns=['name'],
+                                   use_numpy=False)
+        self.assertEqual(result['name'], ['a', 'b', 'c', None])
+
+    def test_typed_buffers(self):
+        column = arrays.builder(Integer(), use_numpy=False)
+        column.extend((1, 2))
+        column.extend((3, None))
+        self.assertEqual(column.finish(), [1, 2, 3, None])
+
+        column = arrays.builder(Float(), use_numpy=False)
+        column.extend((1, 2.5))
+        self.assertEqual(column.finish(), array.array('d', [1.0, 2.5]))
+
+    @unittest.skipIf(arrays.numpy is None, 'requires numpy')
+    def test_numpy(self):
+        result = sql.fetch_columns(self.users, fetch_size=2)
+        self.assertEqual(result['id'].dtype, arrays.numpy.dtype('int64'))
+        self.assertEqual(result['id'].tolist(), [1, 2, 3])
+        self.assertEqual(result['name'].tolist(), ['a', 'b', 'c'])
+
+        column = arrays.builder(Boolean())
+        column.extend((True, None))
+        self.assertEqual(column.finish().tolist(), [True, None])
+
+
+class UpsertTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.users = testlib.Schema().users
+
+    def compile(self, expr, dialect):
+        return str(expr.compile(dialect=dialect))
+
+    def test_postgresql(self):
+        expr = sql.upsert_expr(self.users, ['email'], ['email', 'name'],
+                               'postgresql')
+        text = self.compile(expr, postgresql.dialect())
+        self.assertTrue('ON CONFLICT (email) DO UPDATE SET name = '
+                        'excluded.name' in text)
+
+        expr = sql.upsert_expr(self.users, ['email'], ['email'], 'postgresql')
+        text = self.compile(expr, postgresql.dialect())
+        self.assertTrue('ON CONFLICT (email) DO NOTHING' in text)
+
+    def test_mysql(self):
+        expr = sql.upsert_expr(self.users, ['email'], ['email', 'name'],
+                               'mysql')
+        text = self.compile(expr, mysql.dialect())
+        self.assertTrue('ON DUPLICATE KEY UPDATE name = VALUES(name)' in text)
+
+    def test_other_dialects(self):
+        expr = sql.upsert_expr(self.users, ['email'], ['email', 'name'],
+                               'sqlite')
+        self.assertEqual(expr, None)
+
+    def test_update_then_insert_fallback(self):
+        users = testlib.new_schema().create().users
+        user = sql.upsert(users, ['email'], dict(email='a', name='first'),
+                          dialect='generic')
+        self.assertEqual(user['name'], 'first')
+
+        user = sql.upsert(users, ['email'], dict(email='a', name='second'),
+                          dialect='generic')
+        self.assertEqual(user['id'], 1)
+        self.assertEqual(user['name'], 'second')
+
+        user = sql.upsert(users, ['email'], dict(email='a'),
+                          dialect='generic')
+        self.assertEqual(user['name'], 'second')
+
+    def accounts(self):
+        schema = testlib.new_schema()
+        schema.add_table(
+            'accounts',
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('email', Text, unique=True),
+            Column('handle', Text, unique=True),
+            Column('name', Text, nullable=False))
+        return schema.create().accounts
+
+    def test_sqlite_constraint_errors_raise(self):
+        accounts = self.accounts()
+        sql.upsert(accounts, ['email'], dict(email='a', handle='a', name='a'))
+        # NOT NULL violations are not mistaken for conflicts
+        self.assertRaises(exc.IntegrityError, sql.upsert, accounts, ['email'],
+                          dict(email='b', handle='b', name=None))
+        # Neither are unique violations on other columns
+        self.assertRaises(exc.IntegrityError, sql.upsert, accounts, ['email'],
+                          dict(email='c', handle='a', name='c'))
+        self.assertEqual(sql.count_rows(accounts), 1)
+
+    def test_upsert_many_reports_constraint_errors(self):
+        accounts = self.accounts()
+        rows = [dict(email='a', handle='a', name='a'),
+                dict(email='b', handle='a', name='b')]
+        result = sql.upsert_many(accounts, ['email'], rows, batch_size=1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][0], 1)
+        self.assertEqual(sql.count_rows(accounts), 1)
+
+    def test_upsert_many_mixed_columns(self):
+        users = testlib.new_schema().create().users
+        rows = [dict(email='a', name='first'),
+                dict(email='b'),
+                dict(email='a', name='second'),
+                dict(email='c', name='third')]
+        result = sql.upsert_many(users, ['email'], rows, batch_size=3)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count, 4)
+        self.assertEqual(
+            [(u['email'], u['name']) for u in sql.fetchall(users)],
+            [('a', 'second'), ('b', None), ('c', 'third')])
+
+    def test_upsert_many_native_statements_per_column_set(self):
+        users = testlib.new_schema().create().users
+        columns = []
+
+        def upsert_expr(table, conflict_columns, names, dialect):
+            # sqlite cannot run the native statements; record the column
+            # sets and insert using executemany() instead.
+            columns.append(tuple(names))
+            return table.insert()
+
+        rows = [dict(email='a', name='first'),
+                dict(email='b', name='second'),
+                dict(email='c'),
+                dict(email='d', name='fourth')]
+        original = sql.upsert_expr
+        sql.upsert_expr = upsert_expr
+        try:
+            result = sql.upsert_many(users, ['email'], rows,
+                                     dialect='postgresql')
+        finally:
+            sql.upsert_expr = original
+        self.assertTrue(result.ok)
+        self.assertEqual(columns, [('email', 'name'), ('email',),
+                                   ('email', 'name')])
+        self.assertEqual(
+            [(u['email'], u['name']) for u in sql.fetchall(users)],
+            [('a', 'first'), ('b', 'second'), ('c', None), ('d', 'fourth')])
+
+
+class ColumnRunsTestCase(unittest.TestCase):
+
+    def test_consecutive_rows_are_grouped(self):
+        rows = [{'a': 1}, {'a': 2}, {'a': 3, 'b': 3}, {'a': 4}]
+        self.assertEqual(list(sql.column_runs(rows)), [
+            (('a',), [{'a': 1}, {'a': 2}]),
+            (('a', 'b'), [{'a': 3, 'b': 3}]),
+            (('a',), [{'a': 4}]),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
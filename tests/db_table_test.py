@@ -2,6 +2,7 @@ import unittest
 
 from tests import testlib
 
+from skeletor.db import cache
 from skeletor.db import table
 
 
@@ -27,6 +28,17 @@ class DBTableTestCase(unittest.TestCase):
         user = self.table.find_by_id(user_id, context=context)
         self.assertEqual(user['name'], self.name)
 
+    def test_find_by_ids(self):
+        context = self.context
+        ids = [self.table.new(email='%d' % i, context=context)['id']
+               for i in range(5)]
+        users = self.table.find_by_ids(ids[1:] + [42], chunk_size=2,
+                                       context=context)
+        self.assertEqual(sorted(users), sorted(ids[1:] + [42]))
+        self.assertEqual(users[42], None)
+        self.assertEqual(users[ids[1]]['email'], '1')
+        self.assertEqual(users[ids[4]]['email'], '4')
+
     def test_update_user(self):
         context = self.context
         user = self.table.new(name=self.name, email=self.email, context=context)
@@ -87,6 +99,30 @@ class DBTableTestCase(unittest.TestCase):
         self.assertEqual(users[0]['email'], 'a')
         self.assertEqual(users[1]['email'], 'a2')
 
+    def test_upsert(self):
+        context = self.context
+        user = self.table.upsert(['email'], dict(email='a', name='first'),
+                                 context=context)
+        self.assertEqual(user['name'], 'first')
+
+        updated = self.table.upsert(['email'], dict(email='a', name='second'),
+                                    context=context)
+        self.assertEqual(updated['id'], user['id'])
+        self.assertEqual(updated['name'], 'second')
+        self.assertEqual(len(self.table.fetchall(context=context)), 1)
+
+    def test_upsert_many(self):
+        context = self.context
+        self.table.new(email='a', name='old', context=context)
+        rows = [dict(email='a', name='new'), dict(email='b', name='new')]
+        result = self.table.upsert_many(['email'], rows, context=context)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count, 2)
+
+        all_users = self.table.fetchall(context=context)
+        self.assertEqual([(u['id'], u['email'], u['name']) for u in all_users],
+                         [(1, 'a', 'new'), (2, 'b', 'new')])
+
     def test_delete(self):
         context = self.context
         self.table.new(email='a', context=context)
@@ -99,6 +135,389 @@ class DBTableTestCase(unittest.TestCase):
         self.assertEqual(len(all_users), 1)
         self.assertEqual(all_users[0]['email'], 'b')
 
+    def test_update_many(self):
+        context = self.context
+        ids = [self.table.new(email='%d' % i, context=context)['id']
+               for i in range(5)]
+        updates = [(row_id, dict(name='n%d' % row_id)) for row_id in ids]
+        updates.append((ids[0], dict(name='first', email='x')))
+        result = self.table.update_many(updates, batch_size=4,
+                                        context=context)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count, 6)
+
+        users = self.table.fetchall(context=context)
+        self.assertEqual([(u['name'], u['email']) for u in users],
+                         [('first', 'x'), ('n2', '1'), ('n3', '2'),
+                          ('n4', '3'), ('n5', '4')])
+
+    def test_update_many_keeps_updates_in_order(self):
+        context = self.context
+        row_id = self.table.new(email='a', context=context)['id']
+        updates = [(row_id, dict(name='a')),
+                   (row_id, dict(name='b', email='x')),
+                   (row_id, dict(name='c'))]
+        result = self.table.update_many(updates, context=context)
+        self.assertTrue(result.ok)
+        user = self.table.find_by_id(row_id, context=context)
+        self.assertEqual((user['name'], user['email']), ('c', 'x'))
+
+    def test_update_many_reports_failed_batches(self):
+        context = self.context
+        ids = [self.table.new(email='%d' % i, context=context)['id']
+               for i in range(3)]
+        updates = [(ids[0], dict(email='a')), (ids[1], dict(email='a')),
+                   (ids[2], dict(email='c'))]
+        result = self.table.update_many(updates, batch_size=2,
+                                        context=context)
+        self.assertEqual(result.count, 1)
+        index, batch, error = result.errors[0]
+        self.assertEqual(batch, updates[:2])
+        users = self.table.fetchall(context=context)
+        self.assertEqual([u['email'] for u in users], ['0', '1', 'c'])
+
+    def test_delete_ids(self):
+        context = self.context
+        ids = [self.table.new(email='%d' % i, context=context)['id']
+               for i in range(5)]
+        count = self.table.delete_ids(ids[:3] + [42], chunk_size=2,
+                                      context=context)
+        self.assertEqual(count, 3)
+        users = self.table.fetchall(context=context)
+        self.assertEqual([u['id'] for u in users], ids[3:])
+
+    def test_to_columns(self):
+        context = self.context
+        for i in range(3):
+            self.table.new(name='n%d' % (i % 2), email='%d' % i,
+                           context=context)
+        result = self.table.to_columns(name='n0', columns=['id', 'email'],
+                                       context=context)
+        self.assertEqual(list(result), ['id', 'email'])
+        self.assertEqual(list(result['id']), [1, 3])
+        self.assertEqual(list(result['email']), ['0', '2'])
+
+    def test_iter_all(self):
+        context = self.context
+        self.table.new(name='a', email='a', context=context)
+        self.table.new(name='a', email='a2', context=context)
+        self.table.new(name='b', email='b', context=context)
+
+        users = list(self.table.iter_all(fetch_size=2, context=context))
+        self.assertEqual([u['email'] for u in users], ['a', 'a2', 'b'])
+
+        users = self.table.iter_all(name='a', dicts=True, context=context)
+        self.assertEqual(next(users), {'id': 1, 'name': 'a', 'email': 'a'})
+        self.assertEqual(next(users)['email'], 'a2')
+        self.assertEqual(list(users), [])
+
+    def test_paginate(self):
+        context = self.context
+        for i in range(5):
+            self.table.new(name='user', email='%d' % i, context=context)
+
+        rows, cursor = self.table.paginate(limit=2, context=context)
+        self.assertEqual([r['email'] for r in rows], ['0', '1'])
+        self.assertEqual(cursor, 2)
+
+        rows, cursor = self.table.paginate(limit=2, after=cursor,
+                                           context=context)
+        self.assertEqual([r['email'] for r in rows], ['2', '3'])
+
+        rows, cursor = self.table.paginate(limit=2, after=cursor,
+                                           context=context)
+        self.assertEqual([r['email'] for r in rows], ['4'])
+        self.assertEqual(cursor, None)
+
+    def test_pages(self):
+        context = self.context
+        for i in range(5):
+            self.table.new(name='user%d' % (i % 2), email='%d' % i,
+                           context=context)
+
+        pages = list(self.table.pages(limit=2, context=context))
+        self.assertEqual([len(p) for p in pages], [2, 2, 1])
+
+        pages = self.table.pages(order_by=('name', 'id'), descending=True,
+                                 limit=2, context=context)
+        emails = [r['email'] for page in pages for r in page]
+        self.assertEqual(emails, ['3', '1', '4', '2', '0'])
+
+        pages = list(self.table.pages(name='user1', context=context))
+        self.assertEqual(len(pages), 1)
+        self.assertEqual([r['email'] for r in pages[0]], ['1', '3'])
+
+    def test_insert_many(self):
+        context = self.context
+        rows = [dict(name='user%d' % i, email='%d@example.com' % i)
+                for i in range(10)]
+        result = self.table.insert_many(rows, batch_size=3, context=context)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count, 10)
+        # sqlite does not support RETURNING
+        self.assertEqual(result.ids, None)
+
+        all_users = self.table.fetchall(context=context)
+        self.assertEqual(len(all_users), 10)
+        self.assertEqual(all_users[9]['email'], '9@example.com')
+
+    def test_insert_many_reports_failed_batches(self):
+        context = self.context
+        self.table.new(email='b', context=context)
+        rows = [dict(email='a'), dict(email='b'), dict(email='c')]
+        result = self.table.insert_many(rows, batch_size=2, context=context)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.count, 1)
+        self.assertEqual(len(result.errors), 1)
+
+        index, batch, error = result.errors[0]
+        self.assertEqual(index, 0)
+        self.assertEqual(batch, rows[:2])
+
+        all_users = self.table.fetchall(context=context)
+        self.assertEqual([u['email'] for u in all_users], ['b', 'c'])
+
+    def test_insert_many_joins_the_enclosing_transaction(self):
+        context = self.context
+        engine = context.users.bind
+        engine.begin()
+        self.table.insert_many([dict(email='a')], context=context)
+        engine.rollback()
+        self.assertEqual(self.table.fetchall(context=context), [])
+
+    def test_new_many(self):
+        context = self.context
+        result = self.table.new_many([dict(email='a'), dict(email='b')],
+                                     context=context)
+        self.assertEqual(result.count, 2)
+        self.assertEqual(result.rows, None)
+
+
+class DBTableAggregateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = testlib.create_database(self)
+        self.table = table.Table('users')
+        rows = [dict(name='a', email='1'), dict(name='a', email='2'),
+                dict(name='b', email='3')]
+        self.table.insert_many(rows, context=self.context)
+
+    def test_count(self):
+        context = self.context
+        self.assertEqual(self.table.count(context=context), 3)
+        self.assertEqual(self.table.count(name='a', context=context), 2)
+        self.assertEqual(self.table.count(name='c', context=context), 0)
+
+    def test_exists(self):
+        context = self.context
+        self.assertTrue(self.table.exists(context=context))
+        self.assertTrue(self.table.exists(name='b', email='3',
+                                          context=context))
+        self.assertFalse(self.table.exists(name='b', email='1',
+                                           context=context))
+
+    def test_aggregate(self):
+        context = self.context
+        self.assertEqual(self.table.aggregate(count=True, max='id',
+                                              context=context),
+                         (3, 3))
+        self.assertEqual(self.table.aggregate(group_by='name', count=True,
+                                              sum='id', max=['id', 'email'],
+                                              context=context),
+                         [('a', 2, 3, 2, '2'), ('b', 1, 3, 3, '3')])
+        self.assertEqual(self.table.aggregate(group_by=('name',), min='id',
+                                              name='b', context=context),
+                         [('b', 3)])
+        self.assertRaises(ValueError, self.table.aggregate,
+                          group_by='name', context=context)
+
+
+class DBTableProjectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = testlib.create_database(self)
+        self.cache = cache.LRUCache()
+        self.table = table.Table('users', cache=self.cache)
+        self.documents = table.Table('documents')
+
+    def test_columns(self):
+        context = self.context
+        user = self.table.new(name='a', email='a', context=context)
+        self.assertEqual(self.table.find_by_id(user['id'], columns=['name'],
+                                               context=context),
+                         {'name': 'a'})
+        self.assertEqual(self.table.filter_by(email='a', columns=['id'],
+                                              context=context),
+                         {'id': user['id']})
+        # Lookups that name their columns bypass the row cache
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+        rows = self.table.select_all(name='a', columns=['email'],
+                                     context=context)
+        self.assertEqual([dict(row) for row in rows], [{'email': 'a'}])
+        rows = list(self.table.iter_all(columns=['email'], dicts=True,
+                                        context=context))
+        self.assertEqual(rows, [{'email': 'a'}])
+        rows, cursor = self.table.paginate(columns=['email'],
+                                           context=context)
+        self.assertEqual([dict(row) for row in rows],
+                         [{'email': 'a', 'id': user['id']}])
+        users = self.table.find_by_ids([user['id']], columns=['name'],
+                                       context=context)
+        self.assertEqual(users, {user['id']: {'name': 'a', 'id': user['id']}})
+
+    def test_deferred_columns(self):
+        context = self.context
+        document = self.documents.new(title='doc', body='text',
+                                      context=context)
+        self.assertEqual(document, {'id': 1, 'title': 'doc'})
+        document = self.documents.find_by_id(1, columns=['title', 'body'],
+                                             context=context)
+        self.assertEqual(document, {'title': 'doc', 'body': 'text'})
+
+
+class DBTableCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = testlib.create_database(self)
+        self.cache = cache.LRUCache()
+        self.table = table.Table('users', cache=self.cache)
+
+    def test_find_by_id_is_cached(self):
+        context = self.context
+        user = self.table.new(name='a', email='a', context=context)
+        # Rows read back by new() are cached
+        self.assertEqual(self.cache.size(), 2)
+
+        cached = self.table.find_by_id(user['id'], context=context)
+        self.assertEqual(cached, user)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+        # Callers cannot modify the cached row
+        cached['name'] = 'modified'
+        cached = self.table.find_by_id(user['id'], context=context)
+        self.assertEqual(cached['name'], 'a')
+
+    def test_unique_columns_are_cached(self):
+        context = self.context
+        user = self.table.new(name='a', email='a', context=context)
+        self.assertEqual(self.table.filter_by(email='a', context=context),
+                         user)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+        # Non-unique columns are not cached
+        self.table.filter_by(name='a', context=context)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 1)
+
+    def test_find_by_ids_uses_cache(self):
+        context = self.context
+        first = self.table.new(email='a', context=context)
+        second = self.table.new(email='b', context=context)
+        self.cache.clear()
+
+        self.table.find_by_id(first['id'], context=context)
+        users = self.table.find_by_ids([first['id'], second['id'], 42],
+                                       context=context)
+        self.assertEqual(users[first['id']], first)
+        self.assertEqual(users[second['id']], second)
+        self.assertEqual(users[42], None)
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        # The misses were cached
+        self.table.find_by_ids([second['id']], context=context)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    def test_update_invalidates(self):
+        context = self.context
+        user = self.table.new(name='a', email='a', context=context)
+        self.table.update(user['id'], email='b', context=context)
+
+        self.assertEqual(self.table.filter_by(email='a', context=context),
+                         None)
+        user = self.table.filter_by(email='b', context=context)
+        self.assertEqual(user['email'], 'b')
+        user = self.table.find_by_id(user['id'], context=context)
+        self.assertEqual(user['email'], 'b')
+
+    def test_delete_invalidates(self):
+        context = self.context
+        first = self.table.new(email='a', context=context)
+        second = self.table.new(email='b', context=context)
+
+        self.table.delete(id=first['id'], context=context)
+        self.assertEqual(self.table.find_by_id(first['id'], context=context),
+                         None)
+        self.assertEqual(self.cache.size(), 3)
+
+        self.table.delete(email='b', context=context)
+        self.assertEqual(self.cache.size(), 0)
+        self.assertEqual(self.table.find_by_id(second['id'], context=context),
+                         None)
+
+
+class DBTableCacheTransactionTestCase(unittest.TestCase):
+    """The row cache only sees committed rows"""
+
+    def setUp(self):
+        self.schema = testlib.new_schema().create()
+        self.context = testlib.new_context(ctx=self.schema)
+        self.cache = cache.LRUCache()
+        self.table = table.Table('users', cache=self.cache)
+
+    def transaction(self):
+        context = testlib.new_context(ctx=self.schema, commit=True)
+        context.acquire()
+        return context
+
+    def test_rows_are_cached_after_commit(self):
+        context = self.transaction()
+        user = self.table.new(name='a', context=context)
+        self.table.find_by_id(user['id'], context=context)
+        self.assertEqual(self.cache.size(), 0)
+
+        context.success()
+        self.assertEqual(self.cache.size(), 1)
+        self.assertEqual(self.table.find_by_id(user['id'],
+                                               context=self.context), user)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_rollback_discards_rows(self):
+        context = self.transaction()
+        user = self.table.new(name='a', context=context)
+        context.error()
+        self.assertEqual(self.cache.size(), 0)
+        self.assertEqual(self.table.find_by_id(user['id'],
+                                               context=self.context), None)
+
+    def test_savepoint_rollback_discards_rows(self):
+        context = self.transaction()
+        first = self.table.new(email='a', context=context)
+        # The second row fails inside its savepoint
+        with self.assertRaises(ValueError):
+            with context.nested(commit=True):
+                self.table.new(email='b', context=context)
+                raise ValueError('b')
+        context.success()
+        self.assertEqual(self.cache.size(), 2)
+        self.assertEqual(self.table.filter_by(email='a', context=self.context),
+                         first)
+        self.assertEqual(self.table.filter_by(email='b', context=self.context),
+                         None)
+
+    def test_updates_invalidate_after_commit(self):
+        user = self.table.new(name='a', context=self.context)
+        context = self.transaction()
+        self.table.update(user['id'], name='b', context=context)
+        # A concurrent reader caches the old, committed row
+        self.table.cache_store(self.schema.users, user)
+        self.assertEqual(self.cache.size(), 1)
+
+        context.success()
+        self.assertEqual(self.cache.size(), 0)
+        user = self.table.find_by_id(user['id'], context=self.context)
+        self.assertEqual(user['name'], 'b')
+
 
 if __name__ == '__main__':
     unittest.main()
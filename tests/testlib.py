@@ -40,6 +40,13 @@ class Schema(schema.Schema):
             Column('name', Text),
             Column('email', Text, unique=True))
 
+        self.add_table(
+            'documents',
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('title', Text),
+            Column('body', Text),
+            deferred=('body',))
+
 
 class User(object):
 
@@ -1,3 +1,5 @@
+import threading
+import timeit
 import unittest
 
 from skeletor.util import decorators
@@ -110,6 +112,49 @@ def acquires_custom_context_with_bar(*args, **kwargs):
     return (args, kwargs)
 
 
+@decorators.acquire_context(CustomFactory)
+def acquires_custom_context_generator(count, context=None):
+    for i in range(count):
+        yield (i, context)
+
+
+@decorators.acquire_context(CustomFactory)
+def acquires_retry_generator(retry=3, context=None):
+    yield retry
+
+
+class ReusableFactory(CustomFactory):
+    """Custom factory that reuses enclosing contexts"""
+
+    created = []
+
+    @staticmethod
+    def accepts(context, *args, **kwargs):
+        return True
+
+    @staticmethod
+    def create(*args, **kwargs):
+        context = CustomContext(*args, **kwargs)
+        ReusableFactory.created.append(context)
+        return context
+
+
+@decorators.acquire_context(ReusableFactory)
+def acquires_reusable_context(context=None):
+    return context
+
+
+@decorators.acquire_context(ReusableFactory)
+def acquires_nested_reusable_context(context=None):
+    return (context, acquires_reusable_context())
+
+
+@decorators.acquire_context(ReusableFactory)
+def acquires_reusable_context_generator(context=None):
+    yield context
+    yield acquires_reusable_context()
+
+
 class DecoratorsTestCase(unittest.TestCase):
 
     # bind() tests
@@ -361,6 +406,139 @@ class DecoratorsTestCase(unittest.TestCase):
         actual = kwargs['bar']
         self.assertEqual(expect, actual)
 
+    def test_acquire_context_generator_holds_context(self):
+        items = acquires_custom_context_generator(2)
+        index, context = next(items)
+        self.assertEqual(index, 0)
+        # The context has not exited yet
+        self.assertEqual(context.ok(), None)
+
+        index, context = next(items)
+        self.assertEqual(index, 1)
+        self.assertEqual(context.ok(), None)
+
+        self.assertEqual(list(items), [])
+        self.assertTrue(context.ok())
+
+    def test_acquire_context_passes_retry_arguments(self):
+        args, kwargs = acquires_custom_context(retry=5, retry_policy='x')
+        self.assertEqual(kwargs['retry'], 5)
+        self.assertEqual(kwargs['retry_policy'], 'x')
+
+        self.assertEqual(list(acquires_retry_generator(retry=5)), [5])
+
+
+class AmbientContextTestCase(unittest.TestCase):
+
+    def setUp(self):
+        del ReusableFactory.created[:]
+
+    def test_nested_calls_reuse_context(self):
+        outer, inner = acquires_nested_reusable_context()
+        self.assertTrue(outer is inner)
+        self.assertEqual(len(ReusableFactory.created), 1)
+        # The borrowed context is exited once, by its owner
+        self.assertTrue(outer.ok())
+        self.assertEqual(decorators.contexts.entries(), ())
+
+    def test_sequential_calls_do_not_reuse_context(self):
+        first = acquires_reusable_context()
+        second = acquires_reusable_context()
+        self.assertFalse(first is second)
+
+    def test_factories_must_accept_context(self):
+        @decorators.acquire_context(CustomFactory)
+        def nested(context=None):
+            return (context, acquires_custom_context()[1]['context'])
+
+        outer, inner = nested()
+        self.assertFalse(outer is inner)
+
+    def test_generators_do_not_share_context(self):
+        outer, inner = list(acquires_reusable_context_generator())
+        self.assertFalse(outer is inner)
+
+    def test_threads_do_not_share_context(self):
+        results = []
+
+        @decorators.acquire_context(ReusableFactory)
+        def outer(context=None):
+            thread = threading.Thread(
+                target=lambda: results.append(acquires_reusable_context()))
+            thread.start()
+            thread.join()
+            return context
+
+        context = outer()
+        self.assertFalse(context is results[0])
+
+
+class RecordingContextManager(decorators.DefaultContextManager):
+
+    entered = []
+
+    def __enter__(self):
+        RecordingContextManager.entered.append(self.context)
+        return decorators.DefaultContextManager.__enter__(self)
+
+
+@decorators.acquire_context(CustomFactory,
+                            default_contextmgr=RecordingContextManager)
+def acquires_recorded_context(context=None):
+    return context
+
+
+class CustomContextManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingContextManager.entered = []
+
+    def test_custom_contextmgr_sees_supplied_context(self):
+        context = CustomContext()
+        self.assertTrue(acquires_recorded_context(context=context) is context)
+        self.assertEqual(RecordingContextManager.entered, [context])
+
+    def test_custom_contextmgr_creates_context(self):
+        context = acquires_recorded_context()
+        self.assertTrue(isinstance(context, CustomContext))
+        self.assertEqual(RecordingContextManager.entered, [None])
+
+
+def undecorated(context=None):
+    return context
+
+
+@decorators.acquire_context(decorators.DefaultFactory)
+def passthrough(context=None):
+    return context
+
+
+@decorators.acquire_context(CustomFactory)
+def managed(context=None):
+    return context
+
+
+def per_call(fn, number=20000, repeat=3):
+    """Return the best per-call time in seconds"""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+class DecoratorOverheadTestCase(unittest.TestCase):
+    """Micro-benchmark the per-call overhead of acquire_context()"""
+
+    def test_overhead(self):
+        context = decorators.Context()
+        baseline = per_call(lambda: undecorated(context=context))
+        passthrough_time = per_call(lambda: passthrough(context=context))
+        managed_time = per_call(managed)
+
+        # Supplying a context skips creating a context manager
+        self.assertTrue(
+            passthrough_time < managed_time,
+            'acquire_context overhead per call: pass-through %.0fns, '
+            'managed %.0fns' % ((passthrough_time - baseline) * 1e9,
+                                (managed_time - baseline) * 1e9))
+
 
 if __name__ == '__main__':
     unittest.main()
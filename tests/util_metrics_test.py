@@ -0,0 +1,170 @@
+import unittest
+
+from tests import testlib
+
+from skeletor.core import json
+from skeletor.db import decorators
+from skeletor.db import sql
+from skeletor.util import decorators as core_decorators
+from skeletor.util import metrics
+
+
+def creator(commit=False):
+    test_schema = testlib.new_schema()
+    test_schema.create()
+    return testlib.new_context(ctx=test_schema, commit=commit)
+
+
+@decorators.query.bind(creator=creator)
+def select_all(context=None):
+    return sql.fetchall(context.users)
+
+
+@decorators.mutator.bind(creator=creator)
+def insert_users(count, fail=False, context=None):
+    for idx in range(count):
+        context.users.insert(dict(name='user%d' % idx)).execute()
+    if fail:
+        raise ValueError('fail')
+    return select_all(context=context)
+
+
+@decorators.query.bind(creator=creator)
+def iter_users(context=None):
+    for idx in range(3):
+        yield idx
+
+
+class ContextFactory(core_decorators.DefaultFactory):
+
+    @staticmethod
+    def create(*args, **kwargs):
+        return core_decorators.Context()
+
+
+@core_decorators.acquire_context(ContextFactory)
+def plain(context=None):
+    return context
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1, 5, 10))
+        for value in (0, 1, 2, 7, 100):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(),
+                         [(1, 2), (5, 3), (10, 4), ('+Inf', 5)])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 110)
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry(time_buckets=(0.1, 1.0),
+                                         count_buckets=(1, 10))
+
+    def test_record_event(self):
+        events = []
+        self.registry.listeners.append(events.append)
+        event = metrics.Event('pkg.func')
+        event.add('call_seconds', 0.5)
+        event.add('rows', 3)
+        self.registry.record(event)
+
+        self.assertEqual(events, [event])
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot['call_seconds']['pkg.func']['buckets'],
+                         [(0.1, 0), (1.0, 1), ('+Inf', 1)])
+        self.assertEqual(snapshot['rows']['pkg.func']['sum'], 3)
+
+    def test_to_json(self):
+        self.registry.observe('rows', 'pkg.func', 2)
+        data = json.loads(self.registry.to_json())
+        self.assertEqual(data['rows']['pkg.func']['count'], 1)
+        self.assertEqual(data['rows']['pkg.func']['buckets'][-1], ['+Inf', 1])
+
+    def test_prometheus(self):
+        self.registry.observe('call_seconds', 'pkg."func"', 0.5)
+        label = 'function="pkg.\\"func\\""'
+        expect = '\n'.join([
+            '# TYPE skeletor_call_seconds histogram',
+            'skeletor_call_seconds_bucket{%s,le="0.1"} 0' % label,
+            'skeletor_call_seconds_bucket{%s,le="1.0"} 1' % label,
+            'skeletor_call_seconds_bucket{%s,le="+Inf"} 1' % label,
+            'skeletor_call_seconds_sum{%s} 0.5' % label,
+            'skeletor_call_seconds_count{%s} 1' % label,
+            '',
+        ])
+        self.assertEqual(self.registry.prometheus(), expect)
+
+
+class DecoratorMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.enable(metrics.Registry())
+        self.events = []
+        self.registry.listeners.append(self.events.append)
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.registry = metrics.Registry()
+
+    def test_disabled(self):
+        metrics.disable()
+        select_all()
+        self.assertEqual(self.events, [])
+
+    def test_query(self):
+        select_all()
+        self.assertEqual(len(self.events), 1)
+        event = self.events[0]
+        self.assertEqual(event.name, __name__ + '.select_all')
+        self.assertEqual(event.values['rows'], 0)
+        self.assertTrue(event.values['statements'] >= 1)
+        self.assertTrue(event.values['acquire_seconds'] >= 0)
+        self.assertTrue(event.values['call_seconds'] >= 0)
+        self.assertFalse('commit_seconds' in event.values)
+
+    def test_mutator(self):
+        insert_users(2)
+        # The nested query is recorded first, then the mutator
+        nested, event = self.events
+        self.assertEqual(nested.name, __name__ + '.select_all')
+        self.assertEqual(nested.values['rows'], 2)
+        self.assertFalse('acquire_seconds' in nested.values)
+
+        self.assertEqual(event.name, __name__ + '.insert_users')
+        self.assertEqual(event.values['rows'], 2)
+        self.assertTrue('commit_seconds' in event.values)
+        # Enclosing calls include their nested calls' statements
+        self.assertTrue(event.values['statements'] >
+                        nested.values['statements'])
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual(
+            snapshot['call_seconds'][__name__ + '.insert_users']['count'], 1)
+
+    def test_rollback(self):
+        self.assertRaises(ValueError, insert_users, 1, fail=True)
+        event = self.events[-1]
+        self.assertTrue(event.error)
+        self.assertTrue('rollback_seconds' in event.values)
+        self.assertFalse('commit_seconds' in event.values)
+
+    def test_generator(self):
+        self.assertEqual(list(iter_users()), [0, 1, 2])
+        event = self.events[-1]
+        self.assertEqual(event.name, __name__ + '.iter_users')
+        self.assertEqual(event.values['rows'], 3)
+
+    def test_plain_context(self):
+        plain()
+        event = self.events[-1]
+        self.assertEqual(event.name, __name__ + '.plain')
+        self.assertFalse('statements' in event.values)
+
+
+if __name__ == '__main__':
+    unittest.main()
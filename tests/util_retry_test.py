@@ -0,0 +1,51 @@
+import unittest
+
+from skeletor.util import retry
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.delays = []
+        self.policy = retry.RetryPolicy(
+            max_attempts=3, backoff=1.0, max_delay=3.0,
+            retryable=lambda e: isinstance(e, ValueError),
+            sleep=self.delays.append, random=lambda: 0.5)
+
+    def failing(self, failures, exc_type=ValueError):
+        calls = []
+
+        def fn():
+            calls.append(True)
+            if len(calls) <= failures:
+                raise exc_type('failure %d' % len(calls))
+            return len(calls)
+
+        return fn
+
+    def test_retries_until_success(self):
+        self.assertEqual(self.policy.call(self.failing(2)), 3)
+        # Exponential backoff scaled by jitter
+        self.assertEqual(self.delays, [0.5, 1.0])
+        self.assertEqual(self.policy.stats(),
+                         {'attempts': 3, 'retries': 2, 'give_ups': 0})
+
+    def test_gives_up(self):
+        with self.assertRaises(ValueError):
+            self.policy.call(self.failing(3))
+        self.assertEqual(self.policy.stats(),
+                         {'attempts': 3, 'retries': 2, 'give_ups': 1})
+
+    def test_other_errors_are_not_retried(self):
+        with self.assertRaises(KeyError):
+            self.policy.call(self.failing(1, exc_type=KeyError))
+        self.assertEqual(self.policy.stats()['attempts'], 1)
+
+    def test_delays_are_capped(self):
+        self.policy.jitter = False
+        self.assertEqual([self.policy.delay(i) for i in range(1, 5)],
+                         [1.0, 2.0, 3.0, 3.0])
+
+
+if __name__ == '__main__':
+    unittest.main()